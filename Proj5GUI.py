@@ -28,9 +28,15 @@ from TSPClasses import *
 
 # Import in the code with the actual implementation
 from TSPSolver import *
+from scenario_cache import ScenarioCache
 
 
 class PointLineView(QWidget):
+    MAX_LABELS = 300  # a label colour with more labels than this isn't drawn, it would only be clutter
+    ARROW_SCALE = 5.0
+    CITY_SIZE = 2.0  # DIAMETER
+    LABEL_RADIUS = 1.0e3  # half the size of the box a label is centred in
+
     def __init__(self, status_bar, data_range):
         super(QWidget, self).__init__()
         self.setMinimumSize(950, 600)
@@ -42,12 +48,21 @@ class PointLineView(QWidget):
         self.data_range = data_range
         self.start_pt = None
         self.end_pt = None
+        self._geometry = None  # widget coordinates of everything to draw, see _buildGeometry
 
     def displayStatusText(self, text):
         self.status_bar.showMessage(text)
 
+    def invalidate(self):
+        """
+        Drop the cached geometry, so the next paint rebuilds it from the point, edge and label lists.
+        """
+        self._geometry = None
+        self.update()
+
     def clearPoints(self):
         self.pointList = {}
+        self.invalidate()
 
     def clearEdges(self, removeColors=None):
         self.edgeList = {}
@@ -57,13 +72,14 @@ class PointLineView(QWidget):
                     del self.labelList[color]
         else:
             self.labelList = {}
-        self.repaint()
+        self.invalidate()
 
     def addPoints(self, point_list, color):
         if color in self.pointList:
             self.pointList[color].extend(point_list)
         else:
             self.pointList[color] = point_list
+        self.invalidate()
 
     # 	def setStartLoc( self, point ):
     # 		self.start_pt = point
@@ -95,11 +111,21 @@ class PointLineView(QWidget):
             self.labelList[labelColor].append((point, label, xoffset))
         else:
             self.labelList[labelColor] = [(point, label, xoffset)]
+        self.invalidate()
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing, True)
+    def resizeEvent(self, event):
+        self._geometry = None
+        super(PointLineView, self).resizeEvent(event)
+
+    def _buildGeometry(self):
+        """
+        Everything paintEvent draws, in widget coordinates for the current size: one QPainterPath of
+        lines and one of arrowheads per edge colour, one path of dots per point colour, and the label
+        boxes per label colour. The data range is scaled to fit the widget, centred, with y pointing up.
 
+        Time complexity: O(e + p + l) ( e, p, l = numbers of edges, points and labels)
+        Space complexity: O(e + p + l)
+        """
         xr = self.data_range["x"]
         yr = self.data_range["y"]
         w = self.width()
@@ -109,95 +135,126 @@ class PointLineView(QWidget):
             scale = w / (xr[1] - xr[0])
         else:
             scale = h / (yr[1] - yr[0])
+        cx = w / 2.0
+        cy = h / 2.0
+
+        edges = {}
+        for color, lines in self.edgeList.items():
+            path = QPainterPath()
+            arrows = QPainterPath()
+            for edge in lines:
+                x1, y1 = cx + scale * edge.x1(), cy - scale * edge.y1()
+                x2, y2 = cx + scale * edge.x2(), cy - scale * edge.y2()
+                path.moveTo(x1, y1)
+                path.lineTo(x2, y2)
+
+                # arrowhead at the end of the edge, pointing along it
+                length = math.hypot(x2 - x1, y2 - y1)
+                if length == 0.0:
+                    continue
+                ux, uy = (x2 - x1) / length, (y2 - y1) / length
+                a = self.ARROW_SCALE
+                arrows.addPolygon(
+                    QPolygonF(
+                        [
+                            QPointF(x2, y2),
+                            QPointF(x2 - a * (2 * ux - uy), y2 - a * (2 * uy + ux)),
+                            QPointF(x2 - a * (2 * ux + uy), y2 - a * (2 * uy - ux)),
+                        ]
+                    )
+                )
+                arrows.closeSubpath()
+            edges[color] = (path, arrows)
+
+        points = {}
+        for color, point_list in self.pointList.items():
+            path = QPainterPath()
+            for point in point_list:
+                path.addEllipse(QPointF(cx + scale * point.x(), cy - scale * point.y()), self.CITY_SIZE, self.CITY_SIZE)
+            points[color] = path
+
+        # level of detail: a colour with too many labels (e.g. thousands of city names) is left out
+        R = self.LABEL_RADIUS
+        labels = {}
+        for color, label_list in self.labelList.items():
+            if len(label_list) > self.MAX_LABELS:
+                continue
+            labels[color] = [
+                (QRectF(cx + scale * pt.x() + xoff - R, cy - scale * pt.y() - R, 2.0 * R, 2.0 * R), text)
+                for pt, text, xoff in label_list
+            ]
+
+        return {"edges": edges, "points": points, "labels": labels}
 
-        tform = QTransform()
-        tform.translate(self.width() / 2.0, self.height() / 2.0)
-        tform.scale(1.0, -1.0)
-        painter.setTransform(tform)
+    def paintEvent(self, event):
+        if self._geometry is None:
+            self._geometry = self._buildGeometry()
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing, True)
 
-        for color in self.edgeList:
+        for color, (path, arrows) in self._geometry["edges"].items():
             c = QColor(color[0], color[1], color[2])
             painter.setPen(c)
-            for edge in self.edgeList[color]:
-                ln = QLineF(
-                    scale * edge.x1(),
-                    scale * edge.y1(),
-                    scale * edge.x2(),
-                    scale * edge.y2(),
-                )
-                painter.drawLine(ln)
+            painter.drawPath(path)
+            painter.fillPath(arrows, c)
 
-        for color in self.edgeList:
-            c = QColor(color[0], color[1], color[2])
-            painter.setPen(c)
-            for edge in self.edgeList[color]:
-                # arrow_scale = .015
-                arrow_scale = 5.0
-                unit_edge = (edge.x2() - edge.x1(), edge.y2() - edge.y1())
-                unit_edge_mag = math.sqrt((edge.x2() - edge.x1()) ** 2 + (edge.y2() - edge.y1()) ** 2)
-                unit_edge = (unit_edge[0] / unit_edge_mag, unit_edge[1] / unit_edge_mag)
-                unit_edge_perp = (-unit_edge[1], unit_edge[0])
-
-                temp_tform = QTransform()
-                temp_tform.translate(self.width() / 2.0, self.height() / 2.0)
-                temp_tform.scale(1.0, -1.0)
-                temp_tform.translate(scale * edge.x2(), scale * edge.y2())
-                temp_tform.scale(1.0, -1.0)
-                painter.setTransform(temp_tform)
-                # painter.drawText( RECT, label[1], align )
-
-                tri_pts = []
-                tri_pts.append(QPointF(0, 0))
-                tri_pts.append(
-                    QPointF(
-                        -arrow_scale * (2 * unit_edge[0] + unit_edge_perp[0]),
-                        arrow_scale * (2 * unit_edge[1] + unit_edge_perp[1]),
-                    )
-                )
-                tri_pts.append(
-                    QPointF(
-                        -arrow_scale * (2 * unit_edge[0] - unit_edge_perp[0]),
-                        arrow_scale * (2 * unit_edge[1] - unit_edge_perp[1]),
-                    )
-                )
-                tri = QPolygonF(tri_pts)
-                b = painter.brush()
-                painter.setBrush(c)
-                painter.drawPolygon(tri)
-                painter.setBrush(b)
-
-        painter.setTransform(tform)
-        font = QFont("Monospace")
-        font.setStyleHint(QFont.TypeWriter)
-
-        R = 1.0e3
-        CITY_SIZE = 2.0  # DIAMETER
-        RECT = QRectF(-R, -R, 2.0 * R, 2.0 * R)
         align = QTextOption(Qt.Alignment(Qt.AlignHCenter | Qt.AlignVCenter))
-        for color in self.labelList:
-            c = QColor(color[0], color[1], color[2])
-            painter.setPen(c)
-            for label in self.labelList[color]:
-                temp_tform = QTransform()
-                temp_tform.translate(self.width() / 2.0, self.height() / 2.0)
-                temp_tform.scale(1.0, -1.0)
-                pt = label[0]
-                xoff = label[2]
-                temp_tform.translate(scale * pt.x() + xoff, scale * pt.y())
-                temp_tform.scale(1.0, -1.0)
-                painter.setTransform(temp_tform)
-                painter.drawText(RECT, label[1], align)
-
-        painter.setTransform(tform)
-        for color in self.pointList:
+        for color, label_list in self._geometry["labels"].items():
+            painter.setPen(QColor(color[0], color[1], color[2]))
+            for rect, text in label_list:
+                painter.drawText(rect, text, align)
+
+        for color, path in self._geometry["points"].items():
             c = QColor(color[0], color[1], color[2])
             painter.setPen(c)
-            b = painter.brush()
             painter.setBrush(c)
-            for point in self.pointList[color]:
-                pt = QPointF(scale * point.x(), scale * point.y())
-                painter.drawEllipse(pt, CITY_SIZE, CITY_SIZE)
-            painter.setBrush(b)
+            painter.drawPath(path)
+
+
+class SolveWorker(QObject):
+    """
+    Runs one solver call on its own TSPSolver, meant to live on a QThread so the window keeps
+    responding. Each worker gets the scenario it solves when it is created, so generating a new scenario
+    in the window never changes what a running solve sees.
+
+    Every signal carries the worker itself, because a worker deleted with deleteLater once it is done
+    may be gone before the GUI thread handles its last signals, and sender() with it.
+    """
+
+    PROGRESS_INTERVAL = 0.1  # seconds between progress signals, so a solver improving fast can't flood the GUI
+
+    progress = pyqtSignal(object, object)  # worker, results for the best solution so far (see TSPSolver.setListener)
+    finished = pyqtSignal(object, object)  # worker, the solver's final results dictionary
+    failed = pyqtSignal(object, str)  # worker, error message
+
+    def __init__(self, scenario, algorithm, time_allowance):
+        super(SolveWorker, self).__init__()
+        self.solver = TSPSolver(None)
+        self.solver.setupWithScenario(scenario)
+        self.solver.setListener(self._improved)
+        self._algorithm = algorithm
+        self._time_allowance = time_allowance
+        self._last_progress = -math.inf
+
+    def _improved(self, update):
+        # called on the worker thread; the signal delivers the update to the GUI thread
+        if time.time() - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = time.time()
+            self.progress.emit(self, update)
+
+    def run(self):
+        try:
+            results = getattr(self.solver, self._algorithm)(time_allowance=self._time_allowance)
+        except Exception as error:
+            self.failed.emit(self, "{}: {}".format(type(error).__name__, error))
+        else:
+            self.finished.emit(self, results)
+
+    def cancel(self):
+        """
+        Ask the solver to return its best solution so far (safe to call from any thread).
+        """
+        self.solver.stop()
 
 
 class Proj5GUI(QMainWindow):
@@ -209,34 +266,25 @@ class Proj5GUI(QMainWindow):
         self._MAX_SEED = 1000
 
         self._scenario = None
+        self._scenario_cache = ScenarioCache()
+        self._solution = None
+        self._worker = None  # SolveWorker of the solve on display, if one is running
+        self._running = {}  # QThread -> SolveWorker for every solve whose thread has not ended, displayed or not
         self.initUI()
-        self.solver = TSPSolver(self.view)
         self.genParams = {"size": None, "seed": None, "diff": None}
 
     def newPoints(self):
         # TODO - ERROR CHECKING!!!!
         seed = int(self.curSeed.text())
-        random.seed(seed)
-
-        ptlist = []
-        RANGE = self.data_range
-        xr = self.data_range["x"]
-        yr = self.data_range["y"]
         npoints = int(self.size.text())
-        while len(ptlist) < npoints:
-            x = random.uniform(0.0, 1.0)
-            y = random.uniform(0.0, 1.0)
-            if True:
-                xval = xr[0] + (xr[1] - xr[0]) * x
-                yval = yr[0] + (yr[1] - yr[0]) * y
-                ptlist.append(QPointF(xval, yval))
-        return ptlist
+        return randomLocations(npoints, self.data_range, seed)
 
     def generateNetwork(self):
         points = self.newPoints()  # uses current rand seed
         diff = self.diffDropDown.currentText()
         rand_seed = int(self.curSeed.text())
-        self._scenario = Scenario(city_locations=points, difficulty=diff, rand_seed=rand_seed)
+        # the drop-down pads "Easy" with spaces to size itself
+        self._scenario = self._scenario_cache.get(points, diff.strip(), rand_seed)
 
         self.genParams = {
             "size": self.size.text(),
@@ -260,8 +308,9 @@ class Proj5GUI(QMainWindow):
             )
 
     def generateClicked(self):
+        self.detachSolve()
         self.generateNetwork()
-        self.view.addPoints([QPointF(c._x, c._y) for c in self._scenario.get_cities()], (0, 0, 0))
+        self.view.addPoints([QPointF(x, y) for x, y in self._scenario.positions.tolist()], (0, 0, 0))
         self.solveButton.setEnabled(True)
         self.graphReady = True
         self.checkGenInputs()
@@ -274,12 +323,11 @@ class Proj5GUI(QMainWindow):
         self.statusBar.showMessage("")
         self.view.repaint()
 
-    def displaySolution(
-        self,
-    ):  # what about calling this somehow every time a new bssf is found?
+    def displaySolution(self):
+        # called for every progress update, so only the tour's edges and their labels are replaced; the
+        # city labels stay from addCities
         self.view.clearEdges([(64, 64, 255)])  # get rid of edge labels but not point labels
         if self._solution:
-            self.addCities()
             edges = self._solution.enumerateEdges()
             if edges:
                 edgeColor = (128, 128, 255)
@@ -295,20 +343,16 @@ class Proj5GUI(QMainWindow):
                     )
         else:
             self.statusBar.showMessage("No Solution Found.")
-        self.view.repaint()
+        self.view.update()
 
     def randSeedClicked(self):
         new_seed = random.randint(0, self._MAX_SEED - 1)
         self.curSeed.setText("{}".format(new_seed))
         self.view.repaint()
 
-    def solveClicked(
-        self,
-    ):  # need to reset display??? and say "processing..." at bottom???
-        self.solver.setupWithScenario(self._scenario)
-
+    def solveClicked(self):
+        self.detachSolve()
         max_time = float(self.timeLimit.text())
-        # TODO - start on a separate thread
         self.view.clearEdges([(64, 64, 255)])  # get rid of edge labels but not point labels
         self.numSolutions.setText("--")
         self.tourCost.setText("--")
@@ -317,29 +361,94 @@ class Proj5GUI(QMainWindow):
         self.totalStates.setText("--")
         self.prunedStates.setText("--")
         self.statusBar.showMessage("Processing...")
-        # self.view.repaint()
-        # app.processEvents()
-        solve_func = "self.solver." + self.ALGORITHMS[self.algDropDown.currentIndex()][1]
-        results = eval(solve_func)(time_allowance=max_time)
-        if results:
-            self.statusBar.showMessage("")
-            self.numSolutions.setText("{}".format(results["count"]))
-            self.tourCost.setText("{}".format(results["cost"]))
-            self.solvedIn.setText("{:6.6f} seconds".format(results["time"]))
-            self._solution = results["soln"]
-            if "max" in results.keys():
-                self.maxQSize.setText("{}".format(results["max"]))
-            if "total" in results.keys():
-                self.totalStates.setText("{}".format(results["total"]))
-            if "pruned" in results.keys():
-                self.prunedStates.setText("{}".format(results["pruned"]))
-            # if self._solution:
-            self.displaySolution()
-        else:
-            print("GOT NULL SOLUTION BACK!!")  # probably shouldn't ever use this...
-        self.view.repaint()
 
-    # 		app.processEvents()
+        # the worker keeps its own solver and scenario, and lives on its own thread until the solver returns
+        algorithm = self.ALGORITHMS[self.algDropDown.currentIndex()][1]
+        worker = SolveWorker(self._scenario, algorithm, max_time)
+        thread = QThread(self)  # owned by the window until deleteLater, never by a Python reference
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self.solveProgress)
+        worker.finished.connect(self.solveFinished)
+        worker.failed.connect(self.solveFailed)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        worker.failed.connect(worker.deleteLater)
+        thread.finished.connect(self.threadFinished)
+        thread.finished.connect(thread.deleteLater)
+        self._running[thread] = worker
+        self._worker = worker
+
+        self.solveButton.setEnabled(False)
+        self.cancelButton.setEnabled(True)
+        thread.start()
+
+    def cancelClicked(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self.statusBar.showMessage("Cancelling...")
+
+    def detachSolve(self):
+        """
+        Stop the solve in progress, if any, and ignore anything it reports from now on.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self.cancelButton.setEnabled(False)
+
+    def showResults(self, results):
+        self.numSolutions.setText("{}".format(results["count"]))
+        self.tourCost.setText("{}".format(results["cost"]))
+        self.solvedIn.setText("{:6.6f} seconds".format(results["time"]))
+        self._solution = results["soln"]
+        if results.get("max") is not None:
+            self.maxQSize.setText("{}".format(results["max"]))
+        if results.get("total") is not None:
+            self.totalStates.setText("{}".format(results["total"]))
+        if results.get("pruned") is not None:
+            self.prunedStates.setText("{}".format(results["pruned"]))
+        self.displaySolution()
+
+    def solveProgress(self, worker, update):
+        if worker is self._worker:
+            self.showResults(update)
+
+    def solveFinished(self, worker, results):
+        if worker is not self._worker:
+            return  # a solve that was detached, e.g. by generating a new scenario
+        self._worker = None
+        self.cancelButton.setEnabled(False)
+        self.solveButton.setEnabled(True)
+        self.statusBar.showMessage("")
+        self.showResults(results)
+
+    def solveFailed(self, worker, message):
+        if worker is not self._worker:
+            return
+        self._worker = None
+        self.cancelButton.setEnabled(False)
+        self.solveButton.setEnabled(True)
+        self.statusBar.showMessage("Solver failed: {}".format(message))
+
+    def threadFinished(self):
+        """
+        Forget a solve whose thread has ended. finished is emitted just before the thread ends, so wait
+        for it first: by then the worker's deleteLater has been handled on that thread, and dropping the
+        last Python reference to the worker cannot delete it a second time from this one.
+        """
+        thread = self.sender()
+        thread.wait()
+        self._running.pop(thread, None)
+
+    def closeEvent(self, event):
+        self.detachSolve()
+        for thread, worker in list(self._running.items()):
+            worker.cancel()
+            thread.quit()
+            thread.wait()
+        super(Proj5GUI, self).closeEvent(event)
 
     def checkGenInputs(self):
         seed = self.curSeed.text()
@@ -386,6 +495,8 @@ class Proj5GUI(QMainWindow):
         ("Greedy", "greedy"),
         ("Branch and Bound", "branch_and_bound"),
         ("Fancy", "fancy"),
+        ("Lin-Kernighan", "lin_kernighan"),
+        ("Held-Karp", "held_karp"),
     ]  # whitespace hack to get longest to display correctly
 
     def initUI(self):
@@ -406,6 +517,7 @@ class Proj5GUI(QMainWindow):
         self.randSeedButton = QPushButton("Randomize Seed")
         self.generateButton = QPushButton("Generate Scenario")
         self.solveButton = QPushButton("Solve TSP")
+        self.cancelButton = QPushButton("Cancel")
 
         self.curSeed = QLineEdit("20")
         self.curSeed.setFixedWidth(100)
@@ -473,6 +585,7 @@ class Proj5GUI(QMainWindow):
         h.addWidget(self.timeLimit)
         h.addWidget(QLabel("seconds"))
         h.addWidget(self.solveButton)
+        h.addWidget(self.cancelButton)
         h.addStretch(1)
         vbox.addLayout(h)
 
@@ -491,6 +604,7 @@ class Proj5GUI(QMainWindow):
 
         self.lastPath = (None, None)
         self.solveButton.setEnabled(False)
+        self.cancelButton.setEnabled(False)
 
         self.curSeed.textChanged.connect(self.checkGenInputs)
         self.size.textChanged.connect(self.checkGenInputs)
@@ -498,6 +612,7 @@ class Proj5GUI(QMainWindow):
         self.randSeedButton.clicked.connect(self.randSeedClicked)
         self.generateButton.clicked.connect(self.generateClicked)
         self.solveButton.clicked.connect(self.solveClicked)
+        self.cancelButton.clicked.connect(self.cancelClicked)
 
         self.diffDropDown.addItem(
             "Easy                               "
@@ -6,36 +6,61 @@ import random
 
 import numpy as np
 
+import tsplib
+
 
 class TSPSolution:
+    """
+    A tour stored as an int32 array of city indices into its scenario.
+
+    The list of City objects is only built when `route` is first read (e.g. by the GUI).
+    """
+
+    __slots__ = ("order", "cost", "_scenario", "_route")
+
     def __init__(self, listOfCities):
-        self.route = listOfCities
+        self._scenario = listOfCities[0]._scenario
+        self.order = np.fromiter((city.index for city in listOfCities), dtype=np.int32, count=len(listOfCities))
+        self._route = listOfCities
         self.cost = self._costOfRoute()
         # print( [c._index for c in listOfCities] )
 
+    @classmethod
+    def fromOrder(cls, scenario, order, cost=None):
+        """
+        Build a solution straight from an array of city indices, without touching City objects.
+
+        :param scenario: Scenario the indices refer to
+        :param order: sequence of city indices in visiting order
+        :param cost: the tour cost if the caller already knows it, otherwise it is computed
+        """
+        solution = cls.__new__(cls)
+        solution._scenario = scenario
+        solution.order = np.asarray(order, dtype=np.int32)
+        solution._route = None
+        solution.cost = solution._costOfRoute() if cost is None else cost
+        return solution
+
+    @property
+    def route(self):
+        if self._route is None:
+            cities = self._scenario.get_cities()
+            self._route = [cities[i] for i in self.order]
+        return self._route
+
+    def _edgeCosts(self):
+        return self._scenario.cost_matrix[self.order, np.roll(self.order, -1)]
+
     def _costOfRoute(self):
-        cost = 0
-        last = self.route[0]
-        for city in self.route[1:]:
-            cost += last.costTo(city)
-            last = city
-        cost += self.route[-1].costTo(self.route[0])
-        return cost
+        cost = self._edgeCosts().sum()
+        return np.inf if cost == np.inf else int(cost)
 
     def enumerateEdges(self):
-        elist = []
-        c1 = self.route[0]
-        for c2 in self.route[1:]:
-            dist = c1.costTo(c2)
-            if dist == np.inf:
-                return None
-            elist.append((c1, c2, int(math.ceil(dist))))
-            c1 = c2
-        dist = self.route[-1].costTo(self.route[0])
-        if dist == np.inf:
+        costs = self._edgeCosts()
+        if np.any(costs == np.inf):
             return None
-        elist.append((self.route[-1], self.route[0], int(math.ceil(dist))))
-        return elist
+        route = self.route
+        return [(route[k], route[(k + 1) % len(route)], int(cost)) for k, cost in enumerate(costs)]
 
 
 def nameForInt(num):
@@ -47,71 +72,321 @@ def nameForInt(num):
         return nameForInt((num - 1) // 26) + nameForInt((num - 1) % 26 + 1)
 
 
+def randomLocations(npoints, data_range, seed):
+    """
+    npoints city coordinates drawn uniformly over data_range, the same points the GUI generates for a
+    seed: random is seeded with seed, then each city takes two random.uniform(0.0, 1.0) draws for x and y.
+
+    :param data_range: {"x": [min, max], "y": [min, max]}
+    :return: (npoints, 2) array of coordinates
+    """
+    random.seed(seed)
+    unit = np.array([random.random() for _ in range(2 * npoints)]).reshape(-1, 2)
+    xr = data_range["x"]
+    yr = data_range["y"]
+    return np.column_stack([xr[0] + (xr[1] - xr[0]) * unit[:, 0], yr[0] + (yr[1] - yr[0]) * unit[:, 1]])
+
+
 class Scenario:
     HARD_MODE_FRACTION_TO_REMOVE = 0.20  # Remove 20% of the edges
 
     def __init__(self, city_locations, difficulty, rand_seed):
+        """
+        :param city_locations: (n, 2) array of coordinates, or a sequence of points with x() and y()
+            methods (e.g. QPointF)
+        :param difficulty: "Easy", "Normal", "Hard" or "Hard (Deterministic)"
+        :param rand_seed: seed for "Hard (Deterministic)", which draws everything from random seeded with it
+        """
         self._difficulty = difficulty
 
-        if difficulty in ["Normal", "Hard"]:
-            self._cities = [City(pt.x(), pt.y(), random.uniform(0.0, 1.0)) for pt in city_locations]
-        elif difficulty == "Hard (Deterministic)":
+        if isinstance(city_locations, np.ndarray):
+            positions = np.asarray(city_locations, dtype=float).reshape(-1, 2)
+        else:
+            positions = np.array([(pt.x(), pt.y()) for pt in city_locations], dtype=float).reshape(-1, 2)
+        positions.flags.writeable = False
+        self._positions = positions
+        ncities = len(positions)
+
+        if difficulty == "Hard (Deterministic)":
             random.seed(rand_seed)
-            self._cities = [City(pt.x(), pt.y(), random.uniform(0.0, 1.0)) for pt in city_locations]
+        if difficulty in ["Normal", "Hard", "Hard (Deterministic)"]:
+            # one random.uniform(0.0, 1.0) per city, in city order
+            elevations = np.array([random.random() for _ in range(ncities)])
         else:
-            self._cities = [City(pt.x(), pt.y()) for pt in city_locations]
+            elevations = np.zeros(ncities)
+        elevations.flags.writeable = False
+        self._elevations = elevations
 
-        for num, city in enumerate(self._cities):
-            # if difficulty == "Hard":
-            city.setScenario(self)
-            city.setIndexAndName(num, nameForInt(num + 1))
+        self._cities = None  # City objects are only built when get_cities is first called
 
         # Assume all edges exists except self-edges
-        ncities = len(self._cities)
-        self._edge_exists = (np.ones((ncities, ncities)) - np.diag(np.ones((ncities)))) > 0
+        self._edge_exists = ~np.eye(ncities, dtype=bool)
 
         if difficulty == "Hard":
             self.thinEdges()
         elif difficulty == "Hard (Deterministic)":
             self.thinEdges(deterministic=True)
 
+        self._cost_matrix = None
+        self._geometric = True
+
+    @classmethod
+    def fromArrays(cls, positions, elevations, difficulty, cost_matrix, geometric=True):
+        """
+        Rebuild a scenario from arrays saved earlier (see scenario_cache.py), without drawing anything
+        from random or recomputing costs.
+
+        :param positions: (n, 2) array of coordinates
+        :param elevations: array of n elevations
+        :param difficulty: the difficulty the arrays were generated with
+        :param cost_matrix: the scenario's (n, n) cost matrix, INF for removed edges and self-edges
+        :param geometric: whether the costs were built from the positions as Scenario builds them (see
+            geometric); False for costs from elsewhere, e.g. a TSPLIB file
+        """
+        scenario = cls.__new__(cls)
+        scenario._difficulty = difficulty
+        scenario._positions = positions
+        scenario._elevations = elevations
+        scenario._cities = None
+        scenario._edge_exists = None  # only needed to build the cost matrix
+        scenario._cost_matrix = cost_matrix
+        scenario._geometric = geometric
+        return scenario
+
+    @classmethod
+    def fromTSPLIB(cls, path, missing_edge=None):
+        """
+        Load a TSPLIB .tsp or .atsp file (EUC_2D, CEIL_2D or EXPLICIT weights, see tsplib.read_problem).
+        Costs are the file's, so tour costs match published optimal values. Cities without coordinates
+        or display data are laid out on a circle for display.
+
+        Example: price a known optimal tour
+            scenario = Scenario.fromTSPLIB("a280.tsp")
+            optimal = TSPSolution.fromOrder(scenario, tsplib.read_tour("a280.opt.tour"))
+
+        :param missing_edge: weights this large or larger are missing edges (INF)
+        """
+        problem = tsplib.read_problem(path, missing_edge)
+        ncities = problem["dimension"]
+        positions = problem["positions"]
+        if positions is None:
+            angles = 2 * math.pi * np.arange(ncities) / max(ncities, 1)
+            positions = np.column_stack([np.cos(angles), np.sin(angles)])
+        cost_matrix = problem["cost_matrix"]
+        cost_matrix.flags.writeable = False
+        return cls.fromArrays(positions, np.zeros(ncities), problem["type"], cost_matrix, geometric=False)
+
+    def saveTSPLIB(self, path, name=None, comment=None):
+        """
+        Save as a TSPLIB file with an EXPLICIT matrix of this scenario's costs (see tsplib.write_problem).
+        """
+        tsplib.write_problem(path, self.cost_matrix, self.positions, name, comment)
+
     def get_cities(self):
+        if self._cities is None:
+            cities = []
+            for num, ((x, y), elevation) in enumerate(zip(self._positions.tolist(), self._elevations.tolist())):
+                city = City(x, y, elevation)
+                city.setScenario(self)
+                city.setIndexAndName(num, nameForInt(num + 1))
+                cities.append(city)
+            self._cities = cities
         return self._cities
 
-    def randperm(self, n):  # isn't there a numpy function that does this and even gets called in Solver?
-        perm = np.arange(n)
-        for i in range(n):
-            randind = random.randint(i, n - 1)
-            save = perm[i]
-            perm[i] = perm[randind]
-            perm[randind] = save
-        return perm
+    @property
+    def cost_matrix(self):
+        """
+        Read-only (n, n) matrix where entry [i, j] is the cost of travelling from city i to city j,
+        exactly as City.costTo defines it (np.inf for self-edges and removed edges).
+
+        The matrix is built once, on first access, so every solver shares the same costs.
+
+        Time complexity: O(n^2) on first access, O(1) afterwards
+        Space complexity: O(n^2)
+        """
+        if self._cost_matrix is None:
+            self._cost_matrix = self._build_cost_matrix()
+        return self._cost_matrix
+
+    @property
+    def geometric(self):
+        """
+        True if the costs are the scaled distances between positions (plus elevation changes), as
+        _build_cost_matrix computes them, so positions can be used to find cheap edges. False when
+        the positions are only for display.
+        """
+        return self._geometric
+
+    @property
+    def positions(self):
+        """
+        Read-only (n, 2) array of city coordinates.
+        """
+        return self._positions
+
+    @property
+    def elevations(self):
+        """
+        Read-only array of city elevations (all zero in Easy mode).
+        """
+        return self._elevations
+
+    def _build_cost_matrix(self):
+        x, y = self.positions.T
+        elevation = self.elevations
+
+        # Euclidean Distance, rows are the source city and columns the destination
+        cost = np.sqrt((x[np.newaxis, :] - x[:, np.newaxis]) ** 2 + (y[np.newaxis, :] - y[:, np.newaxis]) ** 2)
+
+        # For Medium and Hard modes, add in an asymmetric cost (in easy mode it is zero).
+        if self._difficulty != "Easy":
+            cost += elevation[np.newaxis, :] - elevation[:, np.newaxis]
+            cost = np.maximum(cost, 0.0)
+
+        cost = np.ceil(cost * City.MAP_SCALE)
+        # Removed edges and self-edges cost INF
+        cost[~self._edge_exists] = np.inf
+        cost.flags.writeable = False
+        return cost
+
+    THIN_BATCH_MARGIN = 1.1  # draw this many times the edges still needed per batch in thinEdges
 
     def thinEdges(self, deterministic=False):
-        ncities = len(self._cities)
+        """
+        Remove HARD_MODE_FRACTION_TO_REMOVE of the edges at random, keeping a random tour so at least one
+        tour exists.
+
+        In deterministic mode the edges are exactly the ones the original one-pair-at-a-time loop drew
+        from random (which the constructor seeded with rand_seed), so a seed keeps thinning the same
+        edges as in the scenarios behind existing results (see _thinEdgesSeeded).
+
+        Otherwise edges are drawn in vectorized batches of uniformly random pairs from a NumPy generator,
+        keeping the distinct ones that may still be deleted; when a batch turns up more than are still
+        needed, a random subset of them is removed. Nothing in this depends on which edge is which, so
+        every set of deletable edges of the right size is equally likely, as with drawing pairs one at a
+        time.
+
+        Time complexity: O(n^2)
+        Space complexity: O(n^2)
+        """
+        ncities = len(self._positions)
         edge_count = ncities * (ncities - 1)  # can't have self-edge
-        num_to_remove = np.floor(self.HARD_MODE_FRACTION_TO_REMOVE * edge_count)
+        num_to_remove = int(np.floor(self.HARD_MODE_FRACTION_TO_REMOVE * edge_count))
 
+        if deterministic:
+            self._thinEdgesSeeded(ncities, num_to_remove)
+            return
+        if ncities < 2:
+            return
+
+        rng = np.random.default_rng()
         can_delete = self._edge_exists.copy()
 
         # Set aside a route to ensure at least one tour exists
-        route_keep = np.random.permutation(ncities)
-        if deterministic:
-            route_keep = self.randperm(ncities)
-        for i in range(ncities):
-            can_delete[route_keep[i], route_keep[(i + 1) % ncities]] = False
+        route_keep = rng.permutation(ncities)
+        can_delete[route_keep, np.roll(route_keep, -1)] = False
 
-        # Now remove edges until
+        flat_edges = self._edge_exists.reshape(-1)
+        flat_can_delete = can_delete.reshape(-1)
+        hit = np.zeros(flat_edges.size, dtype=bool)
+        # Now remove edges until enough are gone
         while num_to_remove > 0:
-            if deterministic:
-                src = random.randint(0, ncities - 1)
-                dst = random.randint(0, ncities - 1)
-            else:
-                src = np.random.randint(ncities)
-                dst = np.random.randint(ncities)
-            if self._edge_exists[src, dst] and can_delete[src, dst]:
-                self._edge_exists[src, dst] = False
-                num_to_remove -= 1
+            deletable_share = np.count_nonzero(flat_can_delete) / flat_can_delete.size
+            batch = rng.integers(0, flat_edges.size, int(num_to_remove / deletable_share * self.THIN_BATCH_MARGIN) + 1)
+            hit[batch] = True
+            removed = np.flatnonzero(hit & flat_can_delete)
+            hit[batch] = False
+            if len(removed) > num_to_remove:
+                removed = rng.choice(removed, num_to_remove, replace=False, shuffle=False)
+            flat_edges[removed] = False
+            flat_can_delete[removed] = False
+            num_to_remove -= len(removed)
+
+    SEEDED_BLOCK_WORDS = 2 ** 20  # most 32-bit words drawn at once by _thinEdgesSeeded
+
+    def _thinEdgesSeeded(self, ncities, num_to_remove):
+        """
+        thinEdges for "Hard (Deterministic)": the same edges, and random left in the same state, as the
+        original implementation, which drew (random.randint(0, n - 1), random.randint(0, n - 1)) pairs one
+        at a time and removed each deletable edge it had not removed yet.
+
+        random is a Mersenne Twister, and randint(0, n - 1) takes the top n.bit_length() bits of its
+        next 32-bit word, drawing again while they are n or more. So the pair draws are replayed in
+        vectorized blocks on a NumPy MT19937 loaded with random's state: shift each block of words, drop
+        the rejected ones, pair up the rest and keep the first new deletable edges in draw order. random
+        then gets the state after exactly the words the original loop would have drawn.
+
+        Time complexity: O(n^2)
+        Space complexity: O(n^2)
+        """
+        can_delete = self._edge_exists.copy()
+
+        # Set aside a route to ensure at least one tour exists: a Fisher-Yates shuffle on random
+        route_keep = np.arange(ncities)
+        for i in range(ncities):
+            j = random.randint(i, ncities - 1)
+            route_keep[i], route_keep[j] = route_keep[j], route_keep[i]
+        can_delete[route_keep, np.roll(route_keep, -1)] = False
+
+        if num_to_remove <= 0:
+            return
+        version, internal_state, gauss_next = random.getstate()
+        bit_generator = np.random.MT19937()
+        bit_generator.state = {
+            "bit_generator": "MT19937",
+            "state": {"key": np.array(internal_state[:-1], dtype=np.uint32), "pos": internal_state[-1]},
+        }
+        words = np.random.Generator(bit_generator)  # full-range uint32 integers are the raw 32-bit words
+
+        shift = 32 - ncities.bit_length()
+        draw_bits = self.SEEDED_BLOCK_WORDS.bit_length()  # enough for the index of any pair in a block
+        accept_share = ncities / 2 ** ncities.bit_length()
+        flat_can_delete = can_delete.reshape(-1)
+        deletable = np.count_nonzero(flat_can_delete)
+        source = None  # a source city drawn at the end of the previous block, still waiting for its destination
+        while num_to_remove > 0:
+            # two accepted words per pair, and only deletable pairs count
+            expected = 2 * num_to_remove * flat_can_delete.size / deletable / accept_share
+            size = min(int(expected * self.THIN_BATCH_MARGIN) + 2, self.SEEDED_BLOCK_WORDS)
+            block_state = bit_generator.state
+            values = words.integers(0, 2 ** 32, size, dtype=np.uint32) >> shift
+            accepted = values < ncities  # randint draws again for the rest
+            cities = values.compress(accepted)
+            if source is not None:
+                cities = np.concatenate(([source], cities))
+            npairs = len(cities) // 2
+            edges = cities[0 : 2 * npairs : 2].astype(np.int64) * ncities + cities[1 : 2 * npairs : 2]
+
+            # first draw of each deletable edge, in draw order: sort (edge, draw) keys, which are all
+            # distinct so any sort will do, and keep the first draw of every edge
+            candidates = np.flatnonzero(flat_can_delete[edges])
+            keys = np.sort(edges[candidates] << draw_bits | np.arange(len(candidates)))
+            sorted_edges = keys >> draw_bits
+            first = np.ones(len(keys), dtype=bool)
+            first[1:] = sorted_edges[1:] != sorted_edges[:-1]
+            keep = np.zeros(len(candidates), dtype=bool)
+            keep[keys[first] & (2 ** draw_bits - 1)] = True
+            first_draws = candidates[keep][:num_to_remove]
+            removed = edges[first_draws]
+            flat_can_delete[removed] = False
+            deletable -= len(removed)
+            num_to_remove -= len(removed)
+
+            if num_to_remove == 0:
+                # rewind to just after the word that completed the last pair removed: the pair's
+                # destination is accepted value 2 * pair + 1, counting the carried source
+                end = np.flatnonzero(accepted)[2 * first_draws[-1] + 1 - (source is not None)]
+                bit_generator.state = block_state
+                words.integers(0, 2 ** 32, int(end) + 1, dtype=np.uint32)
+            source = cities[-1] if len(cities) % 2 else None
+
+        # can_delete is now False exactly on the removed edges, the kept route and the self-edges
+        self._edge_exists &= can_delete
+        self._edge_exists[route_keep, np.roll(route_keep, -1)] = True
+
+        key = bit_generator.state["state"]["key"]
+        position = bit_generator.state["state"]["pos"]
+        random.setstate((version, tuple(int(word) for word in key) + (int(position),), gauss_next))
 
 
 class City:
@@ -141,19 +416,6 @@ class City:
     MAP_SCALE = 1000.0
 
     def costTo(self, other_city):
-
-        assert type(other_city) == City
-
-        # In hard mode, remove edges; this slows down the calculation...
-        # Use this in all difficulties, it ensures INF for self-edge
-        if not self._scenario._edge_exists[self.index, other_city.index]:
-            return np.inf
-
-        # Euclidean Distance
-        cost = math.sqrt((other_city._x - self._x) ** 2 + (other_city._y - self._y) ** 2)
-
-        # For Medium and Hard modes, add in an asymmetric cost (in easy mode it is zero).
-        if self._scenario._difficulty != "Easy":
-            cost += other_city._elevation - self._elevation
-            cost = max(cost, 0.0)
-        return int(math.ceil(cost * self.MAP_SCALE))
+        # Costs (including INF for removed edges and self-edges) are precomputed by the scenario
+        cost = self._scenario.cost_matrix[self.index, other_city.index]
+        return np.inf if cost == np.inf else int(cost)
@@ -1,21 +1,147 @@
 #!/usr/bin/python3
 import itertools
+import multiprocessing
+import os
+import queue
+import threading
 import time
-from contextlib import suppress
-from typing import List
-
-from genetic_algorithm import initial_generation, mutate, breed_population
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from bounds import check_bound
+from branch_and_bound import init_worker, search, search_subtrees, split
+from genetic_algorithm import (
+    ELITE_SIZE,
+    POPULATION_SIZE,
+    breed_population,
+    fitness_matrix,
+    fitness_to_cost,
+    init_island,
+    initial_population,
+    migrate,
+    mutate_population,
+    population_fitness,
+    run_island,
+)
+from greedy import best_tours, best_tours_worker
+from greedy import init_worker as init_greedy_worker
+from held_karp import MAX_MEMORY as HELD_KARP_MAX_MEMORY
+from held_karp import held_karp
+from instrumentation import NULL_PROFILER
+from lin_kernighan import iterated_lin_kernighan
+from local_search import POLISH_SHARE, improve, neighbour_lists
 from models import Node
 from TSPClasses import *
-from queue import PriorityQueue
 
 
 class TSPSolver:
     def __init__(self, gui_view):
         self._scenario = None
+        self._listener = None
+        self._profiler = NULL_PROFILER
+        self._stop = threading.Event()
 
     def setupWithScenario(self, scenario: Scenario):
         self._scenario = scenario
+        self._stop.clear()
+
+    def setListener(self, listener):
+        """
+        Have every solver call listener(update) each time it finds a better solution while it runs.
+        update is a results dictionary with the same keys the solver returns, for the best solution so
+        far, where "time" is the time since the solver started. If listener returns True the solver
+        stops early and returns that solution. The listener runs on the solver's thread.
+
+        :param listener: callable, or None to stop listening
+        """
+        self._listener = listener
+
+    def setProfiler(self, profiler):
+        """
+        Record where the solvers spend their time (phases, counters and the BSSF timeline) in an
+        instrumentation.Profiler.
+
+        :param profiler: Profiler, or None to stop recording
+        """
+        self._profiler = profiler if profiler is not None else NULL_PROFILER
+
+    def stop(self):
+        """
+        Ask the running solver to return its best solution so far as soon as it can. Safe to call from
+        another thread; stays in effect until setupWithScenario is called again.
+        """
+        self._stop.set()
+
+    def _improved(self, start_time, bssf, count, **counters) -> bool:
+        """
+        Pass a better solution to the listener.
+
+        :param counters: values for "max", "total" and "pruned", where the solver has them
+        :return: True if the solver should stop
+        """
+        self._profiler.bssf(time.time() - start_time, bssf.cost)
+        if self._listener is not None:
+            update = {
+                "cost": bssf.cost,
+                "time": time.time() - start_time,
+                "count": count,
+                "soln": bssf,
+                "max": None,
+                "total": None,
+                "pruned": None,
+            }
+            update.update(counters)
+            if self._listener(update):
+                self._stop.set()
+        return self._stop.is_set()
+
+    def _cost_matrix(self):
+        """
+        The scenario's cost matrix, with its construction on first access recorded as the "cost matrix"
+        phase.
+        """
+        with self._profiler.phase("cost matrix"):
+            return self._scenario.cost_matrix
+
+    def stream(self, solver="greedy", **kwargs):
+        """
+        Run a solver on a background thread and yield each update it reports (see setListener) as it
+        comes, then its final results dictionary. Closing the generator early stops the solver.
+
+        Example: stop as soon as a tour costs at most target
+            for results in solver.stream("fancy", time_allowance=60):
+                if results["cost"] <= target:
+                    break
+
+        :param solver: name of the solver method, e.g. "branch_and_bound"
+        :param kwargs: arguments for the solver method
+        """
+        updates = queue.Queue()
+        listener = self._listener
+
+        def run():
+            try:
+                updates.put(("done", getattr(self, solver)(**kwargs)))
+            except BaseException as error:
+                updates.put(("error", error))
+
+        self._stop.clear()
+        self._listener = lambda update: updates.put(("update", update))
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                kind, item = updates.get()
+                if kind == "error":
+                    raise item
+                yield item
+                if kind == "done":
+                    return
+        finally:
+            self._stop.set()
+            thread.join()
+            self._stop.clear()
+            self._listener = listener
 
     """ 
     <summary>
@@ -36,15 +162,15 @@ class TSPSolver:
         count = 0
         bssf = None
         start_time = time.time()
-        while not foundTour and time.time() - start_time < time_allowance:
+        while not foundTour and time.time() - start_time < time_allowance and not self._stop.is_set():
             # create a random permutation
             perm = np.random.permutation(ncities)
-            route = [cities[perm[i]] for i in range(ncities)]
-            bssf = TSPSolution(route)
+            bssf = TSPSolution.fromOrder(self._scenario, perm)
             count += 1
             if bssf.cost < np.inf:
                 # Found a valid route
                 foundTour = True
+                self._improved(start_time, bssf, count)
 
         end_time = time.time()
 
@@ -58,53 +184,82 @@ class TSPSolver:
             "pruned": None,
         }
 
-    def greedy(self, time_allowance=60.0, sample_size=0):
+    def greedy(self, time_allowance=60.0, sample_size=0, workers=1, polish=False, report=True):
         """
         This is the entry point for the greedy algorithm
 
-        Time complexity: O(n^2)
+        Tours are built from every start city in turn, with nearest neighbours found through a
+        spatial grid when costs allow it (see greedy.nearest_neighbour_tour). A tour is abandoned as
+        soon as it cannot beat the ones already kept. With several workers, the start cities are
+        spread over a process pool.
+
+        Time complexity: O(n^2 k) ( k = cities near each step), O(n^3) with elevation
         Space complexity: O(n)
 
         :param sample_size:
         :param time_allowance:
+        :param workers: number of worker processes (1 builds every tour in this process)
+        :param polish: improve the best tour with local search (see local_search), which gets the last
+            POLISH_SHARE of the time allowance; only when no sample is asked for
+        :param report: pass better tours to the listener (see setListener); False when the tour is only a
+            starting point for another solver, which reports for itself
         :return: results dictionary for GUI that contains three ints: cost of best solution,
         time spent to find best solution, total number of solutions found, the best
         solution found, and three null values for fields not used for this
         algorithm
         """
-        start_time = time.time()
-
-        cities = self._scenario.get_cities().copy()
-        random.shuffle(cities)
-        sample = []
+        GREEDY_TASKS_PER_WORKER = 4
 
-        with suppress(StopIteration):
-            for start in cities:
-                route = [start]
-                remaining = cities.copy()
-                remaining.remove(start)
-
-                while remaining:
-                    if time.time() - start_time > time_allowance:
-                        raise StopIteration
-                    nearest = min(remaining, key=lambda city: start.costTo(city))
-                    route.append(nearest)
-                    remaining.remove(nearest)
-                    start = nearest
-
-                solution = TSPSolution(route)
+        start_time = time.time()
+        deadline = start_time + time_allowance
+        tours_deadline = start_time + time_allowance * (1 - POLISH_SHARE) if polish else deadline
+
+        scenario = self._scenario
+        positions = scenario.positions if scenario.geometric else None
+        arrays = (self._cost_matrix(), positions, scenario.elevations)
+        starts = [city.index for city in scenario.get_cities()]
+        random.shuffle(starts)
+        keep = max(sample_size, 1)
+
+        def improved(cost, route):
+            return self._improved(start_time, TSPSolution.fromOrder(scenario, route, cost=int(cost)), 1)
+
+        # only a standalone run reports its tours, a sample is just a starting point for another solver
+        report = report and sample_size <= 0
+        on_improvement = improved if report else None
+
+        with self._profiler.phase("greedy"):
+            if workers == 1:
+                # T: O(n^2 k), S: O(n)
+                tours = best_tours(*arrays, starts, keep, tours_deadline, on_improvement, self._stop)
+            else:
+                ntasks = workers * GREEDY_TASKS_PER_WORKER
+                tasks = [starts[k::ntasks] for k in range(ntasks)]
+                # workers prune against the best tour any of them has found, unless a sample is wanted
+                shared_cost = multiprocessing.Value("d", math.inf) if keep == 1 else None
+                initargs = arrays + (shared_cost,)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=init_greedy_worker, initargs=initargs)
+                with pool:
+                    results = pool.map(
+                        best_tours_worker, tasks, itertools.repeat(keep), itertools.repeat(tours_deadline)
+                    )
+                    tours = sorted(itertools.chain.from_iterable(results), key=lambda tour: tour[0])[:keep]
+                if tours and on_improvement is not None:
+                    on_improvement(*tours[0])
+
+        sample = [TSPSolution.fromOrder(scenario, route, cost=int(cost)) for cost, route in tours]
 
-                if solution.cost < np.inf:
-                    sample.append(solution)
+        bssf = sample[0] if sample else None
+        if polish and bssf is not None and sample_size <= 0 and not self._stop.is_set():
+            bssf = self.polish(bssf, deadline)
+            if report:
+                self._improved(start_time, bssf, 1)
 
         end_time = time.time()
 
-        sample.sort(key=lambda solution: solution.cost)
-        bssf = sample[0] if sample else None
-
         if sample_size <= 0:
             return {
-                "cost": bssf.cost,
+                "cost": bssf.cost if bssf is not None else math.inf,
                 "time": end_time - start_time,
                 "count": 1,
                 "soln": bssf,
@@ -115,7 +270,152 @@ class TSPSolver:
         else:
             return sample[:sample_size]
 
-    def branch_and_bound(self, time_allowance=60.0):
+    def polish(self, solution: TSPSolution, deadline=math.inf, neighbours=None) -> TSPSolution:
+        """
+        Improve a tour with 2-opt, Or-opt and swap moves (see local_search.improve).
+
+        Time complexity: O(n^2) for the neighbour lists, then O(nk) per pass
+        Space complexity: O(nk)
+
+        :param solution: any TSPSolution for this scenario
+        :param deadline: time.time() at which to stop improving
+        :param neighbours: precomputed local_search.neighbour_lists for this scenario
+        :return: the improved solution (no worse than the given one)
+        """
+        with self._profiler.phase("local search"):
+            tour = improve(self._cost_matrix(), solution.order, neighbours, deadline=deadline)
+        return TSPSolution.fromOrder(self._scenario, tour.order, cost=tour.tour_cost())
+
+    def local_search(self, time_allowance=60.0, solution=None):
+        """
+        Local search entry point: the greedy tour (or the given solution) improved with 2-opt, Or-opt
+        and swap moves until no move helps or time runs out.
+
+        Time complexity: O(n^2 k) for the greedy tour, then O(nk) per pass
+        Space complexity: O(nk)
+
+        :param time_allowance: float
+        :param solution: tour to start from, defaults to the greedy tour
+        :return: results dictionary for GUI that contains three ints: cost of best solution,
+        time spent to find best solution, 1 if local search improved the tour (0 otherwise), the best
+        solution found, and three null values for fields not used for this algorithm
+        """
+        start_time = time.time()
+        deadline = start_time + time_allowance
+
+        if solution is None:
+            solution = self.greedy(time_allowance * (1 - POLISH_SHARE), report=False)["soln"]
+        bssf = self.polish(solution, deadline)
+        self._improved(start_time, bssf, int(bssf.cost < solution.cost))
+
+        end_time = time.time()
+        return {
+            "cost": bssf.cost,
+            "time": end_time - start_time,
+            "count": int(bssf.cost < solution.cost),
+            "soln": bssf,
+            "max": None,
+            "total": None,
+            "pruned": None,
+        }
+
+    def lin_kernighan(self, time_allowance=60.0, greedy_starts=10):
+        """
+        Iterated Lin-Kernighan style solver: a greedy tour improved with variable-depth chains of 2-opt
+        moves and Or-opt moves, then kicked with local double bridges and improved again around each
+        kick until time runs out (see lin_kernighan.py).
+
+        Time complexity: O(n^2) for the neighbour lists and starting tour, then O(n + kd) per kick
+        ( d = cities touched by the kick)
+        Space complexity: O(nk)
+
+        :param time_allowance: float
+        :param greedy_starts: number of random start cities tried for the starting tour
+        :return: results dictionary for GUI that contains three ints: cost of best solution,
+        time spent to find best solution, number of improvements found by kicks, the best solution
+        found, a null value, the number of kicks, and a null value
+        """
+        start_time = time.time()
+        deadline = start_time + time_allowance
+        rng = np.random.default_rng()
+
+        scenario = self._scenario
+        cost_matrix = self._cost_matrix()
+        ncities = len(cost_matrix)
+
+        # T: O(n^2), S: O(nk)
+        with self._profiler.phase("neighbour lists"):
+            neighbours = neighbour_lists(cost_matrix)
+        starts = rng.permutation(ncities)[:greedy_starts].tolist()
+        with self._profiler.phase("greedy"):
+            positions = scenario.positions if scenario.geometric else None
+            tours = best_tours(cost_matrix, positions, scenario.elevations, starts, 1, deadline)
+        # a random tour still works as a start when greedy dead-ends, missing edges carry a penalty
+        order = tours[0][1] if tours else rng.permutation(ncities)
+
+        def improved(tour, improvements, kicks):
+            solution = TSPSolution.fromOrder(scenario, tour.order.copy(), cost=tour.tour_cost())
+            return self._improved(start_time, solution, improvements, total=kicks)
+
+        with self._profiler.phase("local search"):
+            tour, improvements, kicks = iterated_lin_kernighan(
+                cost_matrix, order, neighbours, deadline, rng, on_improvement=improved, stop=self._stop
+            )
+        self._profiler.count("kicks", kicks)
+        bssf = TSPSolution.fromOrder(scenario, tour.order, cost=tour.tour_cost())
+
+        end_time = time.time()
+        return {
+            "cost": bssf.cost,
+            "time": end_time - start_time,
+            "count": improvements,
+            "soln": bssf,
+            "max": None,
+            "total": kicks,
+            "pruned": None,
+        }
+
+    def held_karp(self, time_allowance=60.0, max_memory=HELD_KARP_MAX_MEMORY):
+        """
+        Exact solver by Held-Karp dynamic programming over subsets of cities (see held_karp.py).
+
+        Unlike branch and bound, the running time depends only on n, so it is predictable; memory
+        grows as n * 2^n, which limits it to about 20 cities.
+
+        Time complexity: O(n^2 * 2^n)
+        Space complexity: O(n * 2^n)
+
+        :param time_allowance: float
+        :param max_memory: largest number of bytes the DP tables may take
+        :return: results dictionary for GUI that contains three ints: cost of the optimal solution
+        (INF if there is none or time ran out), time spent, number of solutions found (1 or 0), the
+        solution (None if not found), and three more ints: DP states stored, DP states computed, and
+        a null value
+        :raises ValueError: if the DP tables would not fit in max_memory
+        """
+        start_time = time.time()
+
+        ncities = len(self._scenario.get_cities())
+        cost_matrix = self._cost_matrix()
+        with self._profiler.phase("dynamic programming"):
+            path, cost = held_karp(cost_matrix, start_time + time_allowance, max_memory, self._stop)
+        bssf = TSPSolution.fromOrder(self._scenario, path, cost=int(cost)) if path is not None else None
+        states = 2 ** (ncities - 1) * (ncities - 1)
+        if bssf is not None:
+            self._improved(start_time, bssf, 1, max=states, total=states)
+
+        end_time = time.time()
+        return {
+            "cost": bssf.cost if bssf is not None else math.inf,
+            "time": end_time - start_time,
+            "count": int(bssf is not None),
+            "soln": bssf,
+            "max": states,
+            "total": states,
+            "pruned": None,
+        }
+
+    def branch_and_bound(self, time_allowance=60.0, policy="depth", max_frontier=None, bound="reduced"):
         """
         This is the entry point for the branch-and-bound algorithm
 
@@ -123,152 +423,210 @@ class TSPSolver:
         Space Complexity: O(n^3 * 2^n)
 
         :param time_allowance: float
+        :param policy: "depth", "bound" or "hybrid", the order in which states are expanded (see models.Frontier)
+        :param max_frontier: queue size above which the search falls back to depth-first to bound memory
+        :param bound: "reduced", "assignment" or "one_tree" (symmetric costs only), the lower bound
+            checked before a state is expanded on top of the reduced-matrix bound (see bounds.py)
         :return: results dictionary for GUI that contains three ints: cost of best solution,
         time spent to find best solution, total number solutions found during search (does
         not include the initial BSSF), the best solution found, and three more ints:
-        max queue size, total number of states created, and number of pruned states.
+        max queue size, total number of states created, and number of pruned states, plus
+        "pruned_by", the number of states each bound pruned.
         """
+        check_bound(bound, self._cost_matrix())
 
         start_time = time.time()
 
-        queue = PriorityQueue()
-        cities: List[City] = self._scenario.get_cities().copy()
-        # TC: O(n), SC: O(n)
-        city_map = {city.index: city for city in cities}
-        ncities = len(cities)
-
-        count = 0
-        max_queue_size = 0
-        total_states = 0
-        pruned_states = 0
-
-        # Create initial matrix
+        # Create initial node, the only one holding a matrix; other nodes store how theirs differs
         # TC: O(n^2), SC: O(n^2)
-        matrix = np.full((ncities, ncities), np.inf)
-        for i, j in itertools.product(range(ncities), range(ncities)):
-            matrix[i, j] = city_map[i].costTo(city_map[j])
-
-        # Create initial node
-        # TC: O(1), SC: O(1)
-        node = Node(matrix, [cities[0]], 0)
-        queue.put(node)
+        root = Node(0, 0, matrix=self._scenario.cost_matrix.copy())
 
         # Create initial BSSF
         # TC: O(n^2), SC: O(n)
-        bssf = self.greedy(time_allowance)["soln"]
-
-        # TC: O(b^n), SC: O(b^n)
-        while not queue.empty() and time.time() - start_time < time_allowance:
-            node = queue.get()
-
-            max_queue_size = max(max_queue_size, queue.qsize())
-
-            if node.cost >= bssf.cost:
-                pruned_states += 1
-                continue
+        bssf = self.greedy(time_allowance, report=False)["soln"]
+        bssf_cost = bssf.cost if bssf is not None else math.inf
+
+        def improved(path, cost, stats):
+            return self._improved(start_time, TSPSolution.fromOrder(self._scenario, path, cost=int(cost)), **stats)
+
+        # TC: O(n^3 * 2^n), SC: O(n^3 * 2^n)
+        results = search(
+            [root],
+            self._scenario.cost_matrix,
+            bssf_cost,
+            start_time + time_allowance,
+            None,
+            policy,
+            max_frontier,
+            bound,
+            improved,
+            self._stop,
+            self._profiler,
+        )
+        if results["path"] is not None:
+            bssf = TSPSolution.fromOrder(self._scenario, results["path"])
 
-            if len(node.path) == ncities:
-                count += 1
-                bssf = TSPSolution(node.path)
-                continue
+        end_time = time.time()
 
-            current_city = node.path[-1]
-            i = current_city.index
-            # TC: O(n), SC: O(1)
-            for j, city in city_map.items():
-                if city in node.path:
-                    continue
+        return {
+            "cost": bssf.cost if bssf is not None else math.inf,
+            "time": end_time - start_time,
+            "count": results["count"],
+            "soln": bssf,
+            "max": results["max"],
+            "total": results["total"],
+            "pruned": results["pruned"],
+            "pruned_by": results["pruned_by"],
+        }
 
-                new_cost = node.cost + node.matrix[i, j]
+    def branch_and_bound_parallel(
+        self, time_allowance=60.0, workers=None, policy="depth", max_frontier=None, bound="reduced"
+    ):
+        """
+        Parallel branch-and-bound: the search tree is split into subtrees that worker processes search
+        independently, sharing the BSSF cost through shared memory so that a tour found by one worker
+        prunes the others.
 
-                # TC: O(n^2), SC: O(n^2)
-                new_matrix = node.matrix.copy()
-                new_matrix[i, :] = np.inf
-                new_matrix[:, j] = np.inf
-                new_matrix[j, i] = np.inf
+        Time Complexity: O(n^3 * 2^n / p) ( p = number of workers)
+        Space Complexity: O(n^3 * 2^n)
 
-                # TC: O(n), SC: O(1)
-                for k in range(ncities):
-                    min_cell = np.min(new_matrix[k, :])
-                    if min_cell != np.inf:
-                        new_matrix[k, :] -= min_cell
-                        new_cost += min_cell
+        :param time_allowance: float
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param policy: "depth", "bound" or "hybrid", see branch_and_bound
+        :param max_frontier: per-worker queue size above which a worker falls back to depth-first
+        :param bound: extra lower bound, see branch_and_bound
+        :return: results dictionary in the same format as branch_and_bound, with the statistics summed
+        over the workers (max is the sum of the workers' largest queues)
+        """
+        SUBTREES_PER_WORKER = 8
+        STOP_POLL_INTERVAL = 0.1  # seconds between checks for a stop request while workers search
+        check_bound(bound, self._scenario.cost_matrix)
 
-                # TC: O(n), SC: O(1)
-                for k in range(ncities):
-                    min_cell = np.min(new_matrix[:, k])
-                    if min_cell != np.inf:
-                        new_matrix[:, k] -= min_cell
-                        new_cost += min_cell
+        start_time = time.time()
+        workers = workers or os.cpu_count() or 1
 
-                new_path = node.path.copy()
-                new_path.append(city)
+        root = Node(0, 0, matrix=self._scenario.cost_matrix.copy())
+        bssf = self.greedy(time_allowance, workers=workers, report=False)["soln"]
+        bssf_cost = bssf.cost if bssf is not None else math.inf
 
-                new_node = Node(new_matrix, new_path, new_cost)
-                # TC: O(log(b^n)), SC: O(1)
-                queue.put(new_node)
+        # TC: O(p * n^2), SC: O(p)
+        frontier, total_states, pruned_states = split(
+            root, self._scenario.cost_matrix, bssf_cost, workers * SUBTREES_PER_WORKER
+        )
+        # hand out subtrees round-robin so that every task gets a mix of good and bad bounds
+        frontier.sort(key=lambda node: node.cost)
+        tasks = [frontier[k :: workers * SUBTREES_PER_WORKER] for k in range(workers * SUBTREES_PER_WORKER)]
 
-                total_states += 1
+        count = 0
+        max_queue_size = len(frontier)
+        pruned_by = Counter(reduced=pruned_states)  # splitting only uses the reduced-matrix bound
+        best_path = None
+        best_cost = bssf_cost
+        shared_cost = multiprocessing.Value("d", bssf_cost)
+        initargs = (self._scenario.cost_matrix, shared_cost)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+            pending = {
+                pool.submit(search_subtrees, task, start_time + time_allowance, policy, max_frontier, bound)
+                for task in tasks
+                if task
+            }
+            queue_sizes = 0
+            while pending:
+                done, pending = wait(pending, timeout=STOP_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                if self._stop.is_set():
+                    shared_cost.value = -math.inf  # every worker prunes whatever it has left and returns
+
+                for future in done:
+                    results = future.result()
+                    count += results["count"]
+                    queue_sizes += results["max"]
+                    total_states += results["total"]
+                    pruned_states += results["pruned"]
+                    pruned_by.update(results["pruned_by"])
+                    if results["path"] is not None and results["cost"] < best_cost:
+                        best_path, best_cost = results["path"], results["cost"]
+                        solution = TSPSolution.fromOrder(self._scenario, best_path, cost=int(best_cost))
+                        self._improved(start_time, solution, count, total=total_states, pruned=pruned_states)
+            max_queue_size = max(max_queue_size, queue_sizes)
+
+        if best_path is not None:
+            bssf = TSPSolution.fromOrder(self._scenario, best_path)
 
         end_time = time.time()
 
         return {
-            "cost": bssf.cost,
+            "cost": bssf.cost if bssf is not None else math.inf,
             "time": end_time - start_time,
             "count": count,
             "soln": bssf,
             "max": max_queue_size,
             "total": total_states,
             "pruned": pruned_states,
+            "pruned_by": dict(pruned_by),
         }
 
-    def fancy(self, time_allowance=60.0):
+    def fancy(self, time_allowance=60.0, mutation="swap", polish=False):
         """
         Genetic algorithm implementation for TSP
 
-        Time complexity: O(an^2) ( a = number of iterations that can be run in time_allowance)
+        The population is a (POPULATION_SIZE, n) matrix of city indices, so breeding, mutation and cost
+        evaluation each cost a handful of array operations per generation (see genetic_algorithm.py).
+
+        Time complexity: O(an log n) ( a = number of iterations that can be run in time_allowance)
         Space complexity: O(n^2)
 
         :param time_allowance: float
+        :param mutation: "swap", "inversion" or "insertion"
+        :param polish: improve the best tour with local search (see local_search), which gets the last
+            POLISH_SHARE of the time allowance
         :return:
         """
-        POPULATION_SIZE = 200
-        ELITE_SIZE = 20
-
         assert ELITE_SIZE < POPULATION_SIZE
 
         start_time = time.time()
+        evolve_until = start_time + time_allowance * (1 - POLISH_SHARE) if polish else start_time + time_allowance
+        rng = np.random.default_rng()
 
         greedy_sample = self.greedy(time_allowance, sample_size=ELITE_SIZE)  # T: O(n^2), S: O(n)
-        print(len(greedy_sample))
-        cities = self._scenario.get_cities().copy()  # T: O(n), S: O(n)
-        population = initial_generation(cities, POPULATION_SIZE - len(greedy_sample))  # T: O(n), S: O(n)
-        population.extend(greedy_sample)
+        ncities = len(self._scenario.get_cities())
+        population = np.vstack(
+            [initial_population(ncities, POPULATION_SIZE - len(greedy_sample), rng)]  # T: O(n), S: O(n)
+            + [solution.order for solution in greedy_sample]
+        )
+        fitness = fitness_matrix(self._cost_matrix())  # T: O(n^2), S: O(n^2)
+        with self._profiler.phase("cost evaluation"):
+            scores = population_fitness(fitness, population)  # T: O(n)
+        self._profiler.count("tour evaluations", len(population))
 
         bssf_updates = 0
-        bssf = min(population, key=lambda solution: solution.cost)  # T: O(n)
+        best = np.argmin(scores)
+        bssf = TSPSolution.fromOrder(self._scenario, population[best], cost=fitness_to_cost(fitness, scores[best]))
         generations = 1
+        self._improved(start_time, bssf, bssf_updates, max=POPULATION_SIZE, total=generations)
+
+        while time.time() < evolve_until and not self._stop.is_set():  # run time_allowance (less polishing) seconds
+            with self._profiler.phase("breeding"):  # T: O(n log n)
+                population, scores = breed_population(fitness, population, scores, ELITE_SIZE, rng, self._profiler)
+            with self._profiler.phase("mutation"):  # T: O(n)
+                population, scores = mutate_population(fitness, population, scores, mutation, rng, self._profiler)
+            self._profiler.count("generations")
+
+            best = np.argmin(scores)
+            cost = fitness_to_cost(fitness, scores[best])
+            if cost < bssf.cost:
+                bssf_updates += 1
+                bssf = TSPSolution.fromOrder(self._scenario, population[best], cost=cost)
+                self._improved(start_time, bssf, bssf_updates, max=POPULATION_SIZE, total=generations)
 
-        while time.time() - start_time < time_allowance:  # run time_allowance seconds
-            population = breed_population(population, ELITE_SIZE)  # T: O(n^2), S: O(n^2)
-            next_generation = []
-            for individual in population:
-                while True:
-                    child = mutate(individual)  # T: O(n), S: O(n)
-                    if child.cost < individual.cost:
-                        next_generation.append(child)
-                        break
-                    elif random.random() < 0.01:
-                        next_generation.append(child)
-                        break
-
-                if child.cost < bssf.cost:
-                    bssf_updates += 1
-                    bssf = child
-
-            population = next_generation
             generations += 1
 
+        if polish and not self._stop.is_set():
+            polished = self.polish(bssf, start_time + time_allowance)
+            if polished.cost < bssf.cost:
+                bssf_updates += 1
+                bssf = polished
+                self._improved(start_time, bssf, bssf_updates, max=POPULATION_SIZE, total=generations)
+
         end_time = time.time()
         return {
             "cost": bssf.cost,
@@ -279,3 +637,85 @@ class TSPSolver:
             "total": generations,
             "pruned": bssf_updates,
         }
+
+    def fancy_islands(self, time_allowance=60.0, islands=None, migration_interval=5.0, migrants=2, mutation="swap"):
+        """
+        Island-model version of fancy: independent populations evolve in a process pool, each with its
+        own random seed, and every migration_interval seconds the best tours of each island replace the
+        worst tours of the next one (see genetic_algorithm.migrate).
+
+        Time complexity: O(an log n / p) per island ( p = number of islands)
+        Space complexity: O(n^2) per process (each worker holds the fitness matrix)
+
+        :param time_allowance: float
+        :param islands: number of populations (and worker processes), defaults to the number of CPUs
+        :param migration_interval: seconds between migrations (and between checks for a stop request)
+        :param migrants: number of tours each island sends to its neighbour per migration (0 for none)
+        :param mutation: "swap", "inversion" or "insertion"
+        :return: results dictionary in the same format as fancy
+        """
+        assert ELITE_SIZE < POPULATION_SIZE
+        islands = islands or os.cpu_count() or 1
+
+        start_time = time.time()
+        seeds = np.random.SeedSequence()
+
+        greedy_sample = self.greedy(time_allowance, sample_size=ELITE_SIZE * islands, workers=islands)
+        ncities = len(self._scenario.get_cities())
+        fitness = fitness_matrix(self._scenario.cost_matrix)  # T: O(n^2), S: O(n^2)
+
+        # every island starts from its own random tours plus a share of the greedy tours
+        populations = []
+        for k, seed in enumerate(seeds.spawn(islands)):
+            seeded = [solution.order for solution in greedy_sample[k::islands]]
+            population = initial_population(ncities, POPULATION_SIZE - len(seeded), np.random.default_rng(seed))
+            populations.append(np.vstack([population] + seeded))
+        scores = [population_fitness(fitness, population) for population in populations]
+
+        bssf_updates = 0
+        best_island = min(range(islands), key=lambda k: scores[k].min())
+        best_score = scores[best_island].min()
+        best_order = populations[best_island][np.argmin(scores[best_island])]
+        generations = 1
+        solution = TSPSolution.fromOrder(self._scenario, best_order, cost=fitness_to_cost(fitness, best_score))
+        self._improved(start_time, solution, bssf_updates, max=POPULATION_SIZE * islands, total=generations)
+
+        with ProcessPoolExecutor(max_workers=islands, initializer=init_island, initargs=(fitness,)) as pool:
+            while time.time() - start_time < time_allowance and not self._stop.is_set():
+                deadline = min(time.time() + migration_interval, start_time + time_allowance)
+                futures = [
+                    pool.submit(run_island, population, island_scores, ELITE_SIZE, mutation, seed, deadline)
+                    for population, island_scores, seed in zip(populations, scores, seeds.spawn(islands))
+                ]
+
+                populations, scores = [], []
+                improved = False
+                for future in futures:
+                    population, island_scores, island_order, island_score, island_generations = future.result()
+                    populations.append(population)
+                    scores.append(island_scores)
+                    generations += island_generations
+                    if island_score < best_score:
+                        best_order, best_score = island_order, island_score
+                        bssf_updates += 1
+                        improved = True
+                if improved:
+                    solution = TSPSolution.fromOrder(
+                        self._scenario, best_order, cost=fitness_to_cost(fitness, best_score)
+                    )
+                    self._improved(start_time, solution, bssf_updates, max=POPULATION_SIZE * islands, total=generations)
+
+                migrate(populations, scores, migrants)
+
+        bssf = TSPSolution.fromOrder(self._scenario, best_order, cost=fitness_to_cost(fitness, best_score))
+
+        end_time = time.time()
+        return {
+            "cost": bssf.cost,
+            "time": end_time - start_time,
+            "count": bssf_updates,
+            "soln": bssf,
+            "max": POPULATION_SIZE * islands,
+            "total": generations,
+            "pruned": bssf_updates,
+        }
@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from TSPClasses import Scenario, TSPSolution
+from TSPSolver import TSPSolver
+
+# Solving many independent scenarios at once: jobs go out to a process pool a few at a time, each on a
+# fresh TSPSolver, and results come back in the order they finish.
+
+
+def solve_job(job, algorithm: str, time_allowance: float, options: dict, difficulty: str, rand_seed) -> dict:
+    """
+    Process pool entry point: run one solver method on one scenario. A job given as coordinates is
+    built into its Scenario here, so the O(n^2) work (and any reseeding of random) happens in the worker.
+
+    :param job: Scenario, or (n, 2) array of coordinates for Scenario(job, difficulty, rand_seed)
+    :return: the solver's results dictionary, with the tour as "order" (city indices, or None) in place
+        of "soln", so the scenario is not sent back
+    """
+    scenario = job if isinstance(job, Scenario) else Scenario(job, difficulty, rand_seed)
+    solver = TSPSolver(None)
+    solver.setupWithScenario(scenario)
+    results = getattr(solver, algorithm)(time_allowance=time_allowance, **options)
+    solution = results.pop("soln")
+    results["order"] = solution.order if solution is not None else None
+    return results
+
+
+def _with_allowance(job, time_allowance: float) -> tuple:
+    """
+    Split a (job, seconds) pair, or pair a bare job with the default time allowance. Only a 2-tuple of a
+    non-number and a number is a pair, so a tuple of points (or a single point) is a job of its own.
+    """
+    if isinstance(job, tuple) and len(job) == 2 and not np.isscalar(job[0]) and np.isscalar(job[1]):
+        return job
+    return job, time_allowance
+
+
+def solve_batch(
+    jobs,
+    algorithm: str = "greedy",
+    time_allowance: float = 60.0,
+    workers=None,
+    max_in_flight=None,
+    difficulty: str = "Easy",
+    rand_seed=None,
+    options=None,
+):
+    """
+    Solve every job with the same solver method across a process pool, yielding each result as soon as
+    its job finishes.
+
+    jobs is read lazily, and at most max_in_flight jobs are submitted but not yet yielded at any time,
+    so a long (or endless) iterable of jobs takes bounded memory. Scenarios for coordinate arrays are
+    built in the workers, which leaves random in this process alone. Time allowances are the solvers'
+    own, so a job can overrun its allowance by as much as its solver does. Closing the generator early
+    cancels the jobs that have not started.
+
+    Example:
+        for index, results in solve_batch(scenarios, "greedy", 5, workers=4, options={"workers": 1}):
+            print(index, results["cost"])
+
+    :param jobs: iterable of Scenarios or (n, 2) coordinate arrays, each optionally paired with its own
+        time allowance as a (job, seconds) tuple (see _with_allowance)
+    :param algorithm: name of the TSPSolver method, e.g. "branch_and_bound"
+    :param time_allowance: seconds for jobs that do not give their own
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param max_in_flight: jobs submitted at once, defaults to twice the number of workers
+    :param difficulty: difficulty of the scenarios built from coordinate arrays
+    :param rand_seed: rand_seed of the scenarios built from coordinate arrays
+    :param options: dict of further arguments for the solver method, e.g. {"workers": 2} for greedy
+    :return: generator of (index of the job in jobs, results dictionary), where "order" is the tour as
+        city indices (None if none was found) and, for jobs given as Scenarios, "soln" is the tour as a
+        TSPSolution; for coordinate arrays, build one with TSPSolution.fromOrder on a Scenario of your
+        own if needed (only Easy and Hard (Deterministic) ones come out the same)
+    :raises: whatever a job raised, when its result comes up
+    """
+    if not callable(getattr(TSPSolver, algorithm, None)):
+        raise ValueError(f"TSPSolver has no solver {algorithm!r}")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    options = options or {}
+
+    jobs = enumerate(jobs)
+    in_flight = {}  # future -> (index, Scenario or None for coordinate jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        index, job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    job, job_allowance = _with_allowance(job, time_allowance)
+                    scenario = job if isinstance(job, Scenario) else None
+                    if scenario is None:
+                        job = np.asarray(job, dtype=float)
+                    future = pool.submit(solve_job, job, algorithm, job_allowance, options, difficulty, rand_seed)
+                    in_flight[future] = (index, scenario)
+
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, scenario = in_flight.pop(future)
+                    results = future.result()
+                    if scenario is not None:
+                        order = results["order"]
+                        results["soln"] = (
+                            TSPSolution.fromOrder(scenario, order, cost=results["cost"]) if order is not None else None
+                        )
+                    yield index, results
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,173 @@
+import math
+
+import numpy as np
+
+from models import Node
+
+# Extra lower bounds for branch and bound, checked on a node (after its reduced-matrix bound) before it
+# is expanded. Each takes the node, its reduced matrix, the original cost matrix and the current BSSF
+# cost, and returns a lower bound on the cost of any tour that extends the node's path.
+
+ONE_TREE_ITERATIONS = 30
+ONE_TREE_STEP = 2.0  # initial subgradient step scale, halved whenever the bound stops improving
+
+
+def assignment_cost(matrix: np.ndarray) -> float:
+    """
+    Cost of the cheapest assignment of rows to columns of a square matrix (Hungarian algorithm, shortest
+    augmenting path form with row and column potentials). Every entry must be finite.
+
+    Time complexity: O(m^3) ( m = len(matrix)), with the innermost O(m) loop vectorized
+    Space complexity: O(m)
+    """
+    m = len(matrix)
+    u = np.zeros(m + 1)  # row potentials
+    v = np.zeros(m + 1)  # column potentials
+    match = np.zeros(m + 1, dtype=int)  # row matched to each column, column 0 is a sentinel
+    way = np.zeros(m + 1, dtype=int)
+    columns = np.arange(1, m + 1)
+    for row in range(1, m + 1):
+        match[0] = row
+        column = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while match[column] != 0:
+            used[column] = True
+            current = match[column]
+            free = columns[~used[1:]]
+            slack = matrix[current - 1, free - 1] - u[current] - v[free]
+            better = slack < min_slack[free]
+            min_slack[free[better]] = slack[better]
+            way[free[better]] = column
+
+            next_column = free[np.argmin(min_slack[free])]
+            delta = min_slack[next_column]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_slack[free] -= delta
+            column = next_column
+        # flip the augmenting path
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+    return -v[0]
+
+
+def assignment_bound(node: Node, matrix: np.ndarray, cost_matrix: np.ndarray, bssf_cost: float) -> float:
+    """
+    The node's bound plus the cheapest assignment over its reduced matrix: the cities still to leave
+    (the unvisited ones and the path's end) to the cities still to enter (the unvisited ones and the
+    start). Every completion of the path is such an assignment, and the reductions are already counted
+    in the node's bound.
+
+    Time complexity: O(m^3) ( m = cities left)
+    Space complexity: O(m^2)
+    """
+    ncities = len(matrix)
+    unvisited = [city for city in range(ncities) if not node.visits(city)]
+    sub = matrix[np.ix_(unvisited + [node.city], unvisited + [0])]
+
+    # missing edges get a penalty no assignment of finite edges can reach, so using one means no completion
+    finite = np.isfinite(sub)
+    penalty = len(sub) * (sub[finite].max() if finite.any() else 0.0) + 1.0
+    cost = assignment_cost(np.where(finite, sub, penalty))
+    return node.cost + cost if cost < penalty else math.inf
+
+
+def minimum_spanning_tree(costs: np.ndarray) -> tuple[float, np.ndarray]:
+    """
+    Prim's algorithm on a dense symmetric matrix.
+
+    Time complexity: O(m^2)
+    Space complexity: O(m)
+
+    :return: (total cost, degree of every vertex in the tree)
+    """
+    m = len(costs)
+    degree = np.zeros(m, dtype=int)
+    if m <= 1:
+        return 0.0, degree
+    in_tree = np.zeros(m, dtype=bool)
+    in_tree[0] = True
+    distance = costs[0].copy()
+    nearest = np.zeros(m, dtype=int)
+    total = 0.0
+    for _ in range(m - 1):
+        candidates = np.where(in_tree, np.inf, distance)
+        vertex = int(np.argmin(candidates))
+        total += candidates[vertex]
+        degree[vertex] += 1
+        degree[nearest[vertex]] += 1
+        in_tree[vertex] = True
+        closer = costs[vertex] < distance
+        distance[closer] = costs[vertex][closer]
+        nearest[closer] = vertex
+    return total, degree
+
+
+def one_tree_bound(node: Node, matrix: np.ndarray, cost_matrix: np.ndarray, bssf_cost: float) -> float:
+    """
+    Held-Karp style bound for symmetric costs: the path's own cost plus a 1-tree over the rest, improved
+    by subgradient optimization of city penalties.
+
+    A completion is a path from the node's city through every unvisited city back to the start. Its
+    edges among the unvisited cities form a spanning tree of them, plus one edge from the path's end
+    and one into the start, so it costs at least the minimum spanning tree plus the cheapest edge of
+    each kind. Adding a penalty p to both ends of every edge at an unvisited city and subtracting 2p
+    leaves every completion's cost unchanged but moves the tree towards degree 2 everywhere.
+
+    Time complexity: O(ONE_TREE_ITERATIONS * m^2) ( m = cities left)
+    Space complexity: O(m^2)
+    """
+    path = node.path
+    path_cost = cost_matrix[path[:-1], path[1:]].sum()
+    unvisited = [city for city in range(len(cost_matrix)) if not node.visits(city)]
+    costs = cost_matrix[np.ix_(unvisited, unvisited)]
+    from_end = cost_matrix[node.city, unvisited]
+    to_start = cost_matrix[unvisited, 0]
+
+    penalties = np.zeros(len(unvisited))
+    best = -math.inf
+    step = ONE_TREE_STEP
+    for _ in range(ONE_TREE_ITERATIONS):
+        tree_cost, degree = minimum_spanning_tree(costs + penalties[:, np.newaxis] + penalties[np.newaxis, :])
+        leave = int(np.argmin(from_end + penalties))
+        enter = int(np.argmin(to_start + penalties))
+        ends = from_end[leave] + penalties[leave] + to_start[enter] + penalties[enter]
+        bound = tree_cost + ends - 2 * penalties.sum()
+        if bound == math.inf:
+            return math.inf  # the unvisited cities cannot be connected
+        if bound > best:
+            best = bound
+        else:
+            step /= 2
+        if path_cost + best >= bssf_cost:
+            break  # already enough to prune
+
+        degree[leave] += 1
+        degree[enter] += 1
+        subgradient = degree - 2
+        norm = (subgradient ** 2).sum()
+        if norm == 0:
+            break  # the tree is a path through every city, so the bound is exact
+        target = bssf_cost - path_cost if bssf_cost < math.inf else 1.05 * best
+        penalties += step * (target - bound) / norm * subgradient
+    return path_cost + best
+
+
+BOUNDS = {
+    "reduced": None,  # the reduced-matrix bound every node already carries
+    "assignment": assignment_bound,
+    "one_tree": one_tree_bound,
+}
+
+
+def check_bound(bound: str, cost_matrix: np.ndarray):
+    """
+    :raises ValueError: for an unknown bound, or the 1-tree bound on asymmetric costs
+    """
+    if bound not in BOUNDS:
+        raise ValueError(f"Unknown bound {bound!r}, expected one of {', '.join(BOUNDS)}")
+    if bound == "one_tree" and not np.array_equal(cost_matrix, cost_matrix.T):
+        raise ValueError("The 1-tree bound needs symmetric costs (Easy mode)")
@@ -0,0 +1,323 @@
+import time
+from collections import Counter, deque
+from typing import Optional
+
+import numpy as np
+
+from bounds import BOUNDS
+from instrumentation import NULL_PROFILER
+from models import Frontier, Node
+
+
+def reduce_matrix(matrix: np.ndarray) -> float:
+    """
+    Reduce every row and then every column of matrix in place so that each one holds a zero
+    (rows and columns that are all INF are left alone).
+
+    Time complexity: O(n^2)
+    Space complexity: O(n)
+
+    :return: the total subtracted, i.e. the lower bound added by the reduction
+    """
+    row_min = matrix.min(axis=1)
+    row_min[row_min == np.inf] = 0
+    matrix -= row_min[:, np.newaxis]
+
+    col_min = matrix.min(axis=0)
+    col_min[col_min == np.inf] = 0
+    matrix -= col_min[np.newaxis, :]
+
+    return row_min.sum() + col_min.sum()
+
+
+def child_delta(parent: np.ndarray, i: int, j: int, parent_reduced: bool = True):
+    """
+    Bound increase for extending a path along edge i -> j, and the reductions that turn the parent's
+    matrix into the child's (see apply_delta), computed without copying the parent's matrix.
+
+    If parent is not reduced (the root's raw cost matrix) the child is reduced in full. Otherwise,
+    blocking row i, column j and the back-edge j -> i can only remove the zero of a row whose zero sat
+    in column j (or row j, through j -> i), and of a column whose zero sat in row i (or column i). Only
+    those rows and columns are reduced again; every other one still holds a zero.
+
+    Time complexity: O(n * k) ( k = rows and columns affected, n for the root's children)
+    Space complexity: O(n * k)
+
+    :return: (increase over the parent's bound including the cost of i -> j, lines, amounts) where
+        lines holds the reduced rows as r and the reduced columns as n + c, and amounts what was subtracted
+    """
+    n = len(parent)
+    if not parent_reduced:
+        child = parent.copy()
+        child[i, :] = np.inf
+        child[:, j] = np.inf
+        child[j, i] = np.inf
+        row_min = child.min(axis=1)
+        row_min[row_min == np.inf] = 0
+        child -= row_min[:, np.newaxis]
+        col_min = child.min(axis=0)
+        col_min[col_min == np.inf] = 0
+        lines = np.arange(2 * n)
+        amounts = np.concatenate((row_min, col_min))
+    else:
+        rows = (parent[:, j] == 0).nonzero()[0]
+        cols = (parent[i, :] == 0).nonzero()[0]
+        back_edge_was_zero = parent[j, i] == 0
+        if back_edge_was_zero:
+            rows = np.append(rows, j)
+            cols = np.append(cols, i)
+        rows = rows[rows != i]
+        cols = cols[cols != j]
+
+        # the affected rows of the child, with column j and the back-edge blocked
+        child_rows = parent[rows, :]
+        child_rows[:, j] = np.inf
+        if back_edge_was_zero:
+            child_rows[-1, i] = np.inf
+        row_min = child_rows.min(axis=1)
+        row_min[row_min == np.inf] = 0
+
+        # the affected columns of the child after the row reduction, with row i and the back-edge blocked
+        child_cols = parent[:, cols]
+        child_cols[rows, :] -= row_min[:, np.newaxis]
+        child_cols[i, :] = np.inf
+        if back_edge_was_zero:
+            child_cols[j, -1] = np.inf
+        col_min = child_cols.min(axis=0)
+        col_min[col_min == np.inf] = 0
+
+        lines = np.concatenate((rows, n + cols))
+        amounts = np.concatenate((row_min, col_min))
+
+    reduced = amounts > 0
+    cost = parent[i, j] + amounts.sum()
+    return cost, lines[reduced].astype(np.int32), amounts[reduced]
+
+
+def apply_delta(matrix: np.ndarray, i: int, j: int, lines: np.ndarray, amounts: np.ndarray):
+    """
+    Turn a parent's reduced matrix into its child's in place, for the child reached along i -> j.
+
+    Time complexity: O(n * k) ( k = len(lines))
+    Space complexity: O(1)
+    """
+    n = len(matrix)
+    matrix[i, :] = np.inf
+    matrix[:, j] = np.inf
+    matrix[j, i] = np.inf
+    is_row = lines < n
+    matrix[lines[is_row], :] -= amounts[is_row, np.newaxis]
+    matrix[:, lines[~is_row] - n] -= amounts[np.newaxis, ~is_row]
+
+
+def node_matrix(node: Node, known: Optional[tuple[Node, np.ndarray]] = None) -> np.ndarray:
+    """
+    Rebuild a node's reduced matrix by replaying the deltas on the way down from the closest
+    ancestor that holds a matrix (the root), or from `known` = (node.parent, its matrix) if given.
+
+    Time complexity: O(n^2 + d * n * k) ( d = depth replayed)
+    Space complexity: O(n^2)
+    """
+    if node.matrix is not None:
+        return node.matrix.copy()
+
+    if known is not None and node.parent is known[0]:
+        matrix = known[1].copy()
+        apply_delta(matrix, node.parent.city, node.city, node.lines, node.amounts)
+        return matrix
+
+    chain = []
+    while node.matrix is None:
+        chain.append(node)
+        node = node.parent
+    matrix = node.matrix.copy()
+    for child in reversed(chain):
+        apply_delta(matrix, child.parent.city, child.city, child.lines, child.amounts)
+    return matrix
+
+
+def expand(node: Node, matrix: np.ndarray, ncities: int) -> list[Node]:
+    """
+    Children of node for every city not yet on its path; matrix is node's reduced matrix.
+
+    Time complexity: O(n^2)
+    Space complexity: O(n)
+    """
+    children = []
+    i = node.city
+    # TC: O(n), SC: O(1)
+    for j in range(ncities):
+        if node.visits(j):  # TC: O(1)
+            continue
+
+        # The root's matrix is the raw cost matrix, every other node's is already reduced
+        # TC: O(n) per affected row or column, SC: O(n) per affected row or column
+        added_cost, lines, amounts = child_delta(matrix, i, j, parent_reduced=node.parent is not None)
+        children.append(Node(node.cost + added_cost, j, node, lines, amounts))
+    return children
+
+
+def search(
+    nodes: list[Node],
+    cost_matrix: np.ndarray,
+    bssf_cost: float,
+    deadline: float,
+    shared_cost=None,
+    policy: str = "depth",
+    max_frontier: Optional[int] = None,
+    bound: str = "reduced",
+    on_improvement=None,
+    stop=None,
+    profiler=NULL_PROFILER,
+) -> dict:
+    """
+    Branch and bound from the given nodes until the queue is empty or time.time() passes deadline.
+
+    Time Complexity: O(n^3 * 2^n)
+    Space Complexity: O(n^3 * 2^n)
+
+    :param shared_cost: optional multiprocessing.Value holding the best tour cost found by any worker,
+        read for pruning and lowered whenever this search finds a better tour
+    :param policy: order in which nodes are expanded, see models.Frontier
+    :param max_frontier: frontier size above which the search falls back to depth-first, see models.Frontier
+    :param bound: extra lower bound checked before a node is expanded, see bounds.BOUNDS
+    :param on_improvement: optional on_improvement(path, cost, stats), called for every better tour with
+        the "count", "max", "total" and "pruned" statistics so far; returning True stops the search
+    :param stop: optional threading.Event that stops the search when set
+    :param profiler: instrumentation.Profiler that records the "queue", "matrix rebuild", "bound" and
+        "expansion" phases and the number of "states expanded"
+    :return: dict with the best tour found as "path" (None if nothing beat bssf_cost), its "cost" (the
+        given bssf_cost if there is none), the number of improved tours as "count", and the "max" queue
+        size, "total" states created and "pruned" states, with "pruned_by" counting the states each
+        bound pruned
+    """
+    queue = Frontier(policy, max_frontier)
+    queue.extend(nodes)
+    ncities = len(cost_matrix)
+    extra_bound = BOUNDS[bound]
+
+    best_path = None
+    best_cost = bssf_cost  # bssf_cost can drop below it when another worker finds a better tour
+    count = 0
+    max_queue_size = 0
+    total_states = 0
+    pruned_states = 0
+    pruned_by = Counter()
+
+    # last expanded node and its matrix; in depth-first order the next node is usually its child
+    expanded = None
+
+    # TC: O(b^n), SC: O(b^n)
+    while queue and time.time() < deadline and not (stop is not None and stop.is_set()):
+        with profiler.phase("queue"):
+            node = queue.pop()  # TC: O(log(b^n)), SC: O(1)
+
+        max_queue_size = max(max_queue_size, len(queue))
+
+        if shared_cost is not None:
+            bssf_cost = min(bssf_cost, shared_cost.value)
+
+        if node.cost >= bssf_cost:
+            pruned_states += 1
+            pruned_by["reduced"] += 1
+            continue
+
+        if node.path_len == ncities:
+            # the bound leaves out the edge back to the start when it is missing, so price the tour itself
+            path = node.path
+            cost = cost_matrix[path, np.roll(path, -1)].sum()
+            if cost < bssf_cost:
+                count += 1
+                best_path, best_cost = path, cost
+                bssf_cost = cost
+                if shared_cost is not None:
+                    with shared_cost.get_lock():
+                        shared_cost.value = min(shared_cost.value, cost)
+                stats = {"count": count, "max": max_queue_size, "total": total_states, "pruned": pruned_states}
+                if on_improvement is not None and on_improvement(path, cost, stats):
+                    break
+            continue
+
+        # TC: O(n^2), SC: O(n^2)
+        with profiler.phase("matrix rebuild"):
+            matrix = node_matrix(node, expanded)
+        expanded = (node, matrix)
+
+        if extra_bound is not None:
+            with profiler.phase("bound"):
+                pruned = extra_bound(node, matrix, cost_matrix, bssf_cost) >= bssf_cost
+            if pruned:
+                pruned_states += 1
+                pruned_by[bound] += 1
+                continue
+
+        with profiler.phase("expansion"):  # reducing the children's matrices
+            children = expand(node, matrix, ncities)
+        profiler.count("states expanded")
+        # TC: O(n log(b^n)), SC: O(n)
+        with profiler.phase("queue"):
+            queue.extend(children)
+        total_states += len(children)
+
+    return {
+        "path": best_path,
+        "cost": best_cost,
+        "count": count,
+        "max": max_queue_size,
+        "total": total_states,
+        "pruned": pruned_states,
+        "pruned_by": dict(pruned_by),
+    }
+
+
+def split(root: Node, cost_matrix: np.ndarray, bssf_cost: float, size: int) -> tuple[list[Node], int, int]:
+    """
+    Expand the shallowest nodes first until the frontier holds at least `size` subtrees to hand out.
+
+    Time complexity: O(size * n^2)
+    Space complexity: O(size)
+
+    :return: (frontier, states created, states pruned)
+    """
+    ncities = len(cost_matrix)
+    frontier = deque([root])
+    done = []  # complete tours reached while splitting
+    total_states = 0
+    pruned_states = 0
+    while frontier and len(frontier) + len(done) < size:
+        node = frontier.popleft()
+        if node.cost >= bssf_cost:
+            pruned_states += 1
+        elif node.path_len == ncities:
+            done.append(node)
+        else:
+            children = expand(node, node_matrix(node), ncities)
+            frontier.extend(children)
+            total_states += len(children)
+    return list(frontier) + done, total_states, pruned_states
+
+
+# Parallel workers keep the cost matrix and the shared best cost from the pool initializer.
+_worker_cost_matrix = None
+_worker_shared_cost = None
+
+
+def init_worker(cost_matrix: np.ndarray, shared_cost):
+    global _worker_cost_matrix, _worker_shared_cost
+    _worker_cost_matrix = cost_matrix
+    _worker_shared_cost = shared_cost
+
+
+def search_subtrees(
+    nodes: list[Node],
+    deadline: float,
+    policy: str = "depth",
+    max_frontier: Optional[int] = None,
+    bound: str = "reduced",
+) -> dict:
+    """
+    Process pool entry point: search a share of the frontier (see search), pruning with the best cost
+    found by any worker.
+    """
+    shared_cost = _worker_shared_cost
+    return search(nodes, _worker_cost_matrix, shared_cost.value, deadline, shared_cost, policy, max_frontier, bound)
@@ -1,65 +1,252 @@
-import random
+"""
+Headless benchmark runner: every solver x size x seed x difficulty cell of a grid runs in its own process,
+a few at a time, and each finished cell is appended to a CSV in ./data straight away, so an interrupted
+sweep picks up where it left off when run again.
+
+Examples:
+    python data_gather_script.py greedy branch --sizes 10-200 --time-limit 600
+    python data_gather_script.py lk dp --sizes 10-20 --seeds 1-5 --difficulty Easy Hard --workers 4
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import re
 import sys
+import time
+from multiprocessing.connection import wait
 
-import pandas as pd
-from PyQt5.QtCore import QPointF
 from tqdm import tqdm
 
-from TSPClasses import Scenario
+from scenario_cache import DEFAULT_DIRECTORY, ScenarioCache
+from TSPClasses import Scenario, randomLocations
 from TSPSolver import TSPSolver
 
+SOLVERS = {
+    "brute": "defaultRandomTour",
+    "greedy": "greedy",
+    "branch": "branch_and_bound",
+    "fancy": "fancy",
+    "lk": "lin_kernighan",
+    "dp": "held_karp",
+}
 
-args = sys.argv
-solver_function = args[1]
+DIFFICULTIES = ["Easy", "Normal", "Hard", "Hard (Deterministic)"]
 
+# the schema of data/*.csv, which the analysis notebooks read
+COLUMNS = [
+    "# Cities",
+    "Seed",
+    "Running time (sec.)",
+    "Cost of best tour found (*=optimal)",
+    "Max # of stored states at a given time",
+    "# of BSSF updates",
+    "Total # of states created",
+    "Total # of states pruned",
+]
 
-data = []
-seed = 1
 SCALE = 1.0
-diff = "Hard"
-
-data_range = {"x": [-1.5 * SCALE, 1.5 * SCALE], "y": [-SCALE, SCALE]}
-xr = data_range["x"]
-yr = data_range["y"]
-
-
-for npoints in tqdm(range(10, 201)):
-    random.seed(seed)
-    points = []
-    while len(points) < npoints:
-        x = random.uniform(0.0, 1.0)
-        y = random.uniform(0.0, 1.0)
-        xval = xr[0] + (xr[1] - xr[0]) * x
-        yval = yr[0] + (yr[1] - yr[0]) * y
-        points.append(QPointF(xval, yval))
-
-    scenario = Scenario(city_locations=points, difficulty=diff, rand_seed=seed)
-    solver = TSPSolver(None)
-    solver.setupWithScenario(scenario)
-    if solver_function == "fancy":
-        result = solver.fancy(600)
-    elif solver_function == "greedy":
-        result = solver.greedy(600)
-    elif solver_function == "brute":
-        result = solver.defaultRandomTour(600)
-    elif solver_function == "branch":
-        result = solver.branch_and_bound(600)
-    else:
-        raise Exception("Solver function not recognized")
-
-    data.append(
-        {
-            "# Cities": npoints,
-            "Seed": seed,
-            "Running time (sec.)": result["time"],
-            "Cost of best tour found (*=optimal)": result["cost"],
-            "Max # of stored states at a given time": result["max"],
-            "# of BSSF updates": result["count"],
-            "Total # of states created": result["total"],
-            "Total # of states pruned": result["pruned"],
-        }
+DATA_RANGE = {"x": [-1.5 * SCALE, 1.5 * SCALE], "y": [-SCALE, SCALE]}
+
+TIMEOUT_GRACE = 60.0  # seconds a job may run past its time limit before it is killed, by default
+
+
+def parse_range(text: str) -> list[int]:
+    """
+    "10-200" -> [10, ..., 200], "10,20,50" -> [10, 20, 50], and combinations like "5,10-12".
+    """
+    values = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        values.extend(range(int(first), int(last or first) + 1))
+    return values
+
+
+def csv_path(output_dir: str, prefix: str, solver: str, difficulty: str) -> str:
+    """
+    The file the results of a solver go to. Hard mode keeps the names the notebooks read
+    (e.g. data_10_minutes_greedy.csv); other difficulties get their name appended.
+    """
+    name = f"{prefix}_{solver}"
+    if difficulty != "Hard":
+        name += "_" + re.sub(r"\W+", "_", difficulty.lower()).strip("_")
+    return os.path.join(output_dir, name + ".csv")
+
+
+def completed_cells(path: str) -> set[tuple[int, int]]:
+    """
+    (# Cities, Seed) of every row already in a results file.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline="") as file:
+        return {(int(row["# Cities"]), int(row["Seed"])) for row in csv.DictReader(file)}
+
+
+def append_row(path: str, row: dict):
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def sort_rows(path: str):
+    """
+    Rewrite a results file sorted by size and seed (cells are appended in the order they finish).
+    """
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    rows.sort(key=lambda row: (int(row["# Cities"]), int(row["Seed"])))
+    temporary = path + ".tmp"
+    with open(temporary, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temporary, path)
+
+
+def result_row(npoints: int, seed: int, result: dict) -> dict:
+    return {
+        "# Cities": npoints,
+        "Seed": seed,
+        "Running time (sec.)": result["time"],
+        "Cost of best tour found (*=optimal)": result["cost"],
+        "Max # of stored states at a given time": result["max"],
+        "# of BSSF updates": result["count"],
+        "Total # of states created": result["total"],
+        "Total # of states pruned": result["pruned"],
+    }
+
+
+def run_job(
+    connection, solver: str, npoints: int, seed: int, difficulty: str, time_limit: float, cache_dir: str = None
+):
+    """
+    Solve one cell and send ("done", row) or ("error", message) back through connection.
+    Runs in its own process.
+
+    :param cache_dir: ScenarioCache directory to load the scenario from, or None to always build it
+    """
+    try:
+        points = randomLocations(npoints, DATA_RANGE, seed)
+        if cache_dir is not None:
+            scenario = ScenarioCache(cache_dir).get(points, difficulty, seed)
+        else:
+            scenario = Scenario(city_locations=points, difficulty=difficulty, rand_seed=seed)
+        tsp_solver = TSPSolver(None)
+        tsp_solver.setupWithScenario(scenario)
+        result = getattr(tsp_solver, SOLVERS[solver])(time_allowance=time_limit)
+        connection.send(("done", result_row(npoints, seed, result)))
+    except Exception as error:
+        connection.send(("error", f"{type(error).__name__}: {error}"))
+    finally:
+        connection.close()
+
+
+def run_grid(jobs: list[tuple], time_limit: float, timeout: float, workers: int, paths: dict, cache_dir: str = None):
+    """
+    Run (solver, npoints, seed, difficulty) jobs with at most `workers` processes at once. A job still
+    running `timeout` seconds after it started is killed and recorded with its running time and no cost;
+    a job that fails is reported and left out, so it is tried again on the next run.
+
+    :param paths: results file for each (solver, difficulty)
+    :param cache_dir: see run_job
+    """
+    pending = list(reversed(jobs))
+    running = {}  # connection -> (job, process, start time)
+    progress = tqdm(total=len(jobs))
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                job = pending.pop()
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=run_job, args=(sender, *job, time_limit, cache_dir))
+                process.start()
+                sender.close()
+                running[receiver] = (job, process, time.time())
+
+            for connection in wait(list(running), timeout=1.0):
+                (solver, npoints, seed, difficulty), process, _ = running.pop(connection)
+                try:
+                    kind, item = connection.recv()
+                except EOFError:
+                    kind, item = "error", f"process exited with code {process.exitcode}"
+                process.join()
+                connection.close()
+                if kind == "done":
+                    append_row(paths[solver, difficulty], item)
+                else:
+                    tqdm.write(f"{solver} {difficulty} n={npoints} seed={seed} failed: {item}", file=sys.stderr)
+                progress.update()
+
+            now = time.time()
+            for connection, ((solver, npoints, seed, difficulty), process, started) in list(running.items()):
+                if now - started > timeout:
+                    process.kill()
+                    process.join()
+                    connection.close()
+                    del running[connection]
+                    row = result_row(
+                        npoints,
+                        seed,
+                        {"time": now - started, "cost": None, "max": None, "count": None, "total": None, "pruned": None},
+                    )
+                    append_row(paths[solver, difficulty], row)
+                    tqdm.write(f"{solver} {difficulty} n={npoints} seed={seed} timed out", file=sys.stderr)
+                    progress.update()
+    finally:
+        for job, process, _ in running.values():
+            process.kill()
+        progress.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("solvers", nargs="+", choices=sorted(SOLVERS))
+    parser.add_argument("--sizes", type=parse_range, default=parse_range("10-200"), help="e.g. 10-200 or 10,20,50")
+    parser.add_argument("--seeds", type=parse_range, default=[1], help="e.g. 1-5")
+    parser.add_argument("--difficulty", nargs="+", choices=DIFFICULTIES, default=["Hard"])
+    parser.add_argument("--time-limit", type=float, default=600.0, help="time_allowance for every solve (seconds)")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help=f"kill a job after this many seconds (default: time limit + {TIMEOUT_GRACE:.0f})",
     )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="jobs run at once")
+    parser.add_argument("--output-dir", default="./data")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY, help="where scenarios are cached")
+    parser.add_argument("--no-cache", action="store_true", help="build every scenario from scratch")
+    parser.add_argument("--prefix", default="data_10_minutes", help="results go to <prefix>_<solver>.csv")
+    args = parser.parse_args(argv)
+    timeout = args.timeout if args.timeout is not None else args.time_limit + TIMEOUT_GRACE
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = {}
+    jobs = []
+    for solver in args.solvers:
+        for difficulty in args.difficulty:
+            path = csv_path(args.output_dir, args.prefix, solver, difficulty)
+            paths[solver, difficulty] = path
+            done = completed_cells(path)
+            jobs += [
+                (solver, npoints, seed, difficulty)
+                for npoints in args.sizes
+                for seed in args.seeds
+                if (npoints, seed) not in done
+            ]
+    # longest jobs first, so the last ones to finish are short
+    jobs.sort(key=lambda job: -job[1])
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    run_grid(jobs, args.time_limit, timeout, max(1, args.workers), paths, cache_dir)
+    for path in paths.values():
+        if os.path.exists(path):
+            sort_rows(path)
 
 
-df = pd.DataFrame(data)
-df.to_csv(path_or_buf=f"./data/data_10_minutes_{solver_function}.csv", index=False)
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,369 @@
-import random
-from typing import List
+import time
 
-from TSPClasses import City, TSPSolution
+import numpy as np
 
+from instrumentation import NULL_PROFILER
 
-def initial_generation(cities: List[City], population_size: int) -> list[TSPSolution]:
+# A population is a (population_size, n) int32 matrix, one tour of city indices per row, and every
+# operator below works on all rows at once.
+
+POPULATION_SIZE = 200
+ELITE_SIZE = 20
+CHOOSE_ANY_CHANCE = .01
+ELITE_SIZE_FACTOR = 2
+ACCEPT_WORSE_CHANCE = .01
+
+
+def fitness_matrix(cost_matrix: np.ndarray) -> np.ndarray:
+    """
+    Copy of the cost matrix where missing (INF) edges cost a finite penalty larger than any valid tour.
+
+    Keeping every entry finite lets mutations report cost deltas by subtraction (INF - INF is NaN), and a
+    tour's fitness is below `penalty` exactly when the tour is valid, in which case it equals the tour cost.
+
+    Time complexity: O(n^2)
+    Space complexity: O(n^2)
+    """
+    finite = np.isfinite(cost_matrix)
+    penalty = len(cost_matrix) * (cost_matrix[finite].max() if finite.any() else 1.0) + 1.0
+    return np.where(finite, cost_matrix, penalty)
+
+
+def fitness_to_cost(fitness: np.ndarray, score: float):
+    """
+    Convert a tour fitness back to the TSPSolution cost (INF for tours that use a missing edge).
+
+    Time complexity: O(1)
+    """
+    penalty = fitness[0, 0]  # self-edges always carry the penalty
+    return int(score) if score < penalty else np.inf
+
+
+def initial_population(ncities: int, population_size: int, rng: np.random.Generator) -> np.ndarray:
     """
     Time complexity: O(n) (population_size is assumed to be constant)
     Space complexity: O(n)
     """
-    return [TSPSolution(random.sample(cities, len(cities))) for _ in range(population_size)]
+    return rng.permuted(np.tile(np.arange(ncities, dtype=np.int32), (population_size, 1)), axis=1)
 
 
-def mutate(individual: TSPSolution) -> TSPSolution:
+def population_fitness(fitness: np.ndarray, population: np.ndarray) -> np.ndarray:
     """
+    Fitness of every tour in one gather-and-sum.
+
     Time complexity: O(n)
     Space complexity: O(n)
     """
-    cities = individual.route.copy()  # T: O(n)
-    i = random.randint(0, len(cities) - 1)
-    j = random.randint(0, len(cities) - 1)
-    cities[i], cities[j] = cities[j], cities[i]
-    return TSPSolution(cities) # T: O(n), S: O(n)
+    return fitness[population, np.roll(population, -1, axis=1)].sum(axis=1)
 
 
-def breed(individual1: TSPSolution, individual2: TSPSolution) -> TSPSolution:
+def edge_prefix_sums(fitness: np.ndarray, population: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     """
+    Cumulative cost of each tour's edges walked forwards and backwards, so that reversing any segment
+    of an asymmetric tour can be priced in O(1).
+
+    forward[r, k] is the cost of row r walked order[0] -> ... -> order[k], backward[r, k] the cost of
+    order[k] -> ... -> order[0].
+
     Time complexity: O(n)
     Space complexity: O(n)
     """
-    i = random.randint(0, len(individual1.route) - 1)
-    j = random.randint(0, len(individual1.route) - 1)
+    zeros = np.zeros((len(population), 1))
+    forward = np.cumsum(fitness[population[:, :-1], population[:, 1:]], axis=1)
+    backward = np.cumsum(fitness[population[:, 1:], population[:, :-1]], axis=1)
+    return np.hstack((zeros, forward)), np.hstack((zeros, backward))
+
+
+def swap_deltas(fitness: np.ndarray, population: np.ndarray, i: np.ndarray, j: np.ndarray, prefix=None) -> np.ndarray:
+    """
+    Change in tour cost from swapping the cities at positions i and j of each row, priced from the four
+    edges that touch them (three when they are neighbours).
 
-    start = min(i, j)
-    end = max(i, j)
+    Time complexity: O(1) per row
+    Space complexity: O(1) per row
+    """
+    n = population.shape[1]
+    rows = np.arange(len(population))[:, np.newaxis]
+    i, j = i[:, np.newaxis], j[:, np.newaxis]
+
+    # edges are identified by the position they start from
+    starts = np.hstack((i - 1, i, j - 1, j)) % n
+    ends = (starts + 1) % n
+    # when i and j are neighbours an edge touches both, so count it only once
+    duplicate = np.zeros(starts.shape, dtype=bool)
+    for k in range(1, 4):
+        duplicate[:, k] = (starts[:, :k] == starts[:, k : k + 1]).any(axis=1)
 
-    gnome_part_1 = [individual1.route[a] for a in range(start, end)] # T: O(n)
-    gnome_part_2 = [individual2.route[a] for a in range(len(individual2.route)) if individual2.route[a] not in gnome_part_1] # T: O(n)
+    def swapped(positions):
+        return np.where(positions == i, j, np.where(positions == j, i, positions))
 
-    return TSPSolution(gnome_part_1 + gnome_part_2)  # T: O(n), S: O(n)
+    old = fitness[population[rows, starts], population[rows, ends]]
+    new = fitness[population[rows, swapped(starts)], population[rows, swapped(ends)]]
+    return np.where(duplicate, 0.0, new - old).sum(axis=1)
 
 
-def breed_population(population: List[TSPSolution], elite_size: int):
+def inversion_deltas(fitness: np.ndarray, population: np.ndarray, i: np.ndarray, j: np.ndarray, prefix) -> np.ndarray:
     """
-    Time complexity: O(n^2)
-    Space complexity: O(n^2)
+    Change in tour cost from reversing positions i..j (inclusive) of each row. The two boundary edges are
+    replaced, and because costs are asymmetric the edges inside the segment change direction, which is
+    read off `prefix` (from edge_prefix_sums).
+
+    Time complexity: O(1) per row
+    Space complexity: O(1) per row
+    """
+    n = population.shape[1]
+    rows = np.arange(len(population))
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    forward, backward = prefix
+    inner = (backward[rows, hi] - backward[rows, lo]) - (forward[rows, hi] - forward[rows, lo])
+
+    first, last = population[rows, lo], population[rows, hi]
+    before, after = population[rows, lo - 1], population[rows, (hi + 1) % n]
+    delta = inner + fitness[before, last] + fitness[first, after] - fitness[before, first] - fitness[last, after]
+    # reversing the whole tour turns the closing edge around too
+    whole = inner + fitness[first, last] - fitness[last, first]
+    delta = np.where((lo == 0) & (hi == n - 1), whole, delta)
+    return np.where(lo == hi, 0.0, delta)
+
+
+def insertion_deltas(
+    fitness: np.ndarray, population: np.ndarray, i: np.ndarray, j: np.ndarray, prefix=None
+) -> np.ndarray:
+    """
+    Change in tour cost from moving the city at position i to just after the city at position j of each
+    row, priced from the three edges removed and the three edges added.
+
+    Time complexity: O(1) per row
+    Space complexity: O(1) per row
+    """
+    n = population.shape[1]
+    rows = np.arange(len(population))
+    city = population[rows, i]
+    before, after = population[rows, i - 1], population[rows, (i + 1) % n]
+    u, v = population[rows, j], population[rows, (j + 1) % n]
+    delta = (fitness[before, after] + fitness[u, city] + fitness[city, v]) - (
+        fitness[before, city] + fitness[city, after] + fitness[u, v]
+    )
+    return np.where((j == i) | (j == (i - 1) % n), 0.0, delta)
+
+
+def swap(population: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    rows = np.arange(len(population))
+    children = population.copy()
+    children[rows, i], children[rows, j] = population[rows, j], population[rows, i]
+    return children
+
+
+def invert(population: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    positions = np.arange(population.shape[1])[np.newaxis, :]
+    lo, hi = np.minimum(i, j)[:, np.newaxis], np.maximum(i, j)[:, np.newaxis]
+    source = np.where((positions >= lo) & (positions <= hi), lo + hi - positions, positions)
+    return np.take_along_axis(population, source, axis=1)
+
+
+def insert(population: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    n = population.shape[1]
+    positions = np.arange(n)[np.newaxis, :]
+    noop = ((j == i) | (j == (i - 1) % n))[:, np.newaxis]
+    i, j = i[:, np.newaxis], j[:, np.newaxis]
+
+    # moving later: positions i..j-1 shift left and the city lands on j
+    later = j > i
+    source = np.where(later & (positions >= i) & (positions < j), positions + 1, positions)
+    source = np.where(later & (positions == j), i, source)
+    # moving earlier: the city lands on j+1 and positions j+2..i shift right
+    earlier = j < i
+    source = np.where(earlier & (positions == j + 1), i, source)
+    source = np.where(earlier & (positions >= j + 2) & (positions <= i), positions - 1, source)
+
+    return np.take_along_axis(population, np.where(noop, positions, source), axis=1)
+
+
+# operator name -> (delta function, apply function)
+MUTATIONS = {
+    "swap": (swap_deltas, swap),
+    "inversion": (inversion_deltas, invert),
+    "insertion": (insertion_deltas, insert),
+}
+
+
+def mutate_population(
+    fitness: np.ndarray,
+    population: np.ndarray,
+    scores: np.ndarray,
+    operator: str,
+    rng: np.random.Generator,
+    profiler=NULL_PROFILER,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mutate every individual once. A random mutation is kept if it improves the tour (or, rarely, if it
+    does not); otherwise another one is drawn. Candidates are priced from the edges they touch, so
+    children are only built once all rows have an accepted mutation.
+
+    Time complexity: O(n) per round of proposals
+    Space complexity: O(n)
+
+    :param profiler: instrumentation.Profiler recording the pricing as "cost evaluation" and counting
+        "mutation deltas"
+    :return: the mutated population and its fitness
+    """
+    m, n = population.shape
+    delta_function, apply_function = MUTATIONS[operator]
+    prefix = edge_prefix_sums(fitness, population) if operator == "inversion" else None
+
+    i = np.empty(m, dtype=np.intp)
+    j = np.empty(m, dtype=np.intp)
+    delta = np.empty(m)
+    pending = np.arange(m)
+    while len(pending):
+        pi = rng.integers(0, n, len(pending))
+        pj = rng.integers(0, n, len(pending))
+        pending_prefix = None if prefix is None else (prefix[0][pending], prefix[1][pending])
+        with profiler.phase("cost evaluation"):
+            pdelta = delta_function(fitness, population[pending], pi, pj, pending_prefix)
+        profiler.count("mutation deltas", len(pending))
+
+        accepted = (pdelta < 0) | (rng.random(len(pending)) < ACCEPT_WORSE_CHANCE)
+        rows = pending[accepted]
+        i[rows], j[rows], delta[rows] = pi[accepted], pj[accepted], pdelta[accepted]
+        pending = pending[~accepted]
+
+    return apply_function(population, i, j), scores + delta
+
+
+def breed(parents1: np.ndarray, parents2: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Ordered crossover: each child takes a random slice of its first parent, followed by the remaining
+    cities in the order they appear in its second parent.
+
+    Time complexity: O(n log n)
+    Space complexity: O(n)
+    """
+    m, n = parents1.shape
+    rows = np.arange(m)[:, np.newaxis]
+    positions = np.arange(n)[np.newaxis, :]
+
+    cuts = rng.integers(0, n, (m, 2))
+    start, end = cuts.min(axis=1)[:, np.newaxis], cuts.max(axis=1)[:, np.newaxis]
+    gnome_part_1 = (positions >= start) & (positions < end)  # positions taken from parents1
+
+    taken = np.zeros((m, n), dtype=bool)
+    taken[rows, parents1] = gnome_part_1
+    gnome_part_2 = ~taken[rows, parents2]  # positions taken from parents2
+
+    # a stable sort moves the kept genes to the front without reordering them
+    keep = np.hstack((gnome_part_1, gnome_part_2))
+    picks = np.argsort(~keep, axis=1, kind="stable")[:, :n]
+    return np.take_along_axis(np.hstack((parents1, parents2)), picks, axis=1)
+
+
+def breed_population(
+    fitness: np.ndarray,
+    population: np.ndarray,
+    scores: np.ndarray,
+    elite_size: int,
+    rng: np.random.Generator,
+    profiler=NULL_PROFILER,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the elite_size best tours and refill the rest of the population with children of (usually) elite parents.
+
+    Time complexity: O(n log n)
+    Space complexity: O(n)
+
+    :param profiler: instrumentation.Profiler recording the children's fitness as "cost evaluation" and
+        counting "tour evaluations"
+    :return: the next generation and its fitness
+    """
+    ranked = np.argsort(scores, kind="stable")  # T: O(n log n) (average)
+    population, scores = population[ranked], scores[ranked]
+
+    nchildren = len(population) - elite_size
+    # pick random parents, usually from the best of the population
+    pool = np.where(
+        rng.random(nchildren) < CHOOSE_ANY_CHANCE,
+        len(population),
+        min(elite_size * ELITE_SIZE_FACTOR, len(population)),
+    )
+    parents1 = (rng.random(nchildren) * pool).astype(np.intp)
+    parents2 = (rng.random(nchildren) * pool).astype(np.intp)
+    while (same := parents1 == parents2).any():
+        parents2[same] = (rng.random(same.sum()) * pool[same]).astype(np.intp)
+
+    children = breed(population[parents1], population[parents2], rng)  # T: O(n log n), S: O(n)
+
+    next_generation = np.vstack((population[:elite_size], children))
+    with profiler.phase("cost evaluation"):
+        children_scores = population_fitness(fitness, children)
+    profiler.count("tour evaluations", len(children))
+    return next_generation, np.concatenate((scores[:elite_size], children_scores))
+
+
+def evolve(
+    fitness: np.ndarray,
+    population: np.ndarray,
+    scores: np.ndarray,
+    elite_size: int,
+    mutation: str,
+    rng: np.random.Generator,
+    deadline: float,
+):
+    """
+    Run generations until time.time() passes deadline.
+
+    Time complexity: O(an log n) ( a = number of generations that fit before the deadline)
+    Space complexity: O(n)
+
+    :return: (population, scores, best tour seen, its fitness, generations run)
     """
-    population.sort(key=lambda x: x.cost)  # T: O(n log n) (average)
-    next_generation = list(population[:elite_size])  # S: O(n)
+    best = np.argmin(scores)
+    best_order, best_score = population[best].copy(), scores[best]
+    generations = 0
+    while time.time() < deadline:
+        population, scores = breed_population(fitness, population, scores, elite_size, rng)
+        population, scores = mutate_population(fitness, population, scores, mutation, rng)
+        generations += 1
+
+        best = np.argmin(scores)
+        if scores[best] < best_score:
+            best_order, best_score = population[best].copy(), scores[best]
+    return population, scores, best_order, best_score, generations
 
-    CHOOSE_ANY_CHANCE = .01
-    ELITE_SIZE_FACTOR = 2
 
-    for _ in range(elite_size, len(population)): # loops max n times
-        while True:
+# Island workers keep the fitness matrix from the pool initializer so it is only sent to each process once.
+_island_fitness = None
 
-            # pick random parent, weighted by cost
-            if random.random() < CHOOSE_ANY_CHANCE:
-                parent1 = random.choice(population)
-                parent2 = random.choice(population)
-            else:
-                parent1 = random.choice(population[:elite_size * ELITE_SIZE_FACTOR])
-                parent2 = random.choice(population[:elite_size * ELITE_SIZE_FACTOR])
 
-            if parent1 != parent2:
-                break
+def init_island(fitness: np.ndarray):
+    global _island_fitness
+    _island_fitness = fitness
 
-        child = breed(parent1, parent2)  # T: O(n), S: O(n)
 
-        next_generation.append(child)
-    return next_generation
+def run_island(population: np.ndarray, scores: np.ndarray, elite_size: int, mutation: str, seed, deadline: float):
+    """
+    Process pool entry point: evolve one island until deadline (see evolve).
+    """
+    return evolve(_island_fitness, population, scores, elite_size, mutation, np.random.default_rng(seed), deadline)
+
 
+def migrate(populations: list[np.ndarray], scores: list[np.ndarray], migrants: int):
+    """
+    Ring migration: the best `migrants` tours of each island replace the worst tours of the next island.
+    migrants is capped at the smallest island's population, and 0 (or less) migrates nothing.
+
+    Time complexity: O(n)
+    Space complexity: O(n)
+    """
+    migrants = min(migrants, min(len(island_scores) for island_scores in scores))
+    if migrants <= 0:
+        return
+    elites = [np.argsort(island_scores)[:migrants] for island_scores in scores]
+    outgoing = [
+        (population[best].copy(), island_scores[best])
+        for population, island_scores, best in zip(populations, scores, elites)
+    ]
+    for k, (orders, order_scores) in enumerate(outgoing):
+        target = (k + 1) % len(populations)
+        worst = np.argsort(scores[target])[-migrants:]
+        populations[target][worst] = orders
+        scores[target][worst] = order_scores
@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+from spatial import GridIndex
+from TSPClasses import City
+
+
+def nearest_neighbour_tour(
+    cost_matrix: np.ndarray,
+    positions: Optional[np.ndarray],
+    elevations: np.ndarray,
+    start: int,
+    deadline: float = math.inf,
+    cutoff: float = math.inf,
+    shared_cutoff=None,
+) -> Optional[list[int]]:
+    """
+    Greedy tour from `start` that always moves to the cheapest unvisited city.
+
+    When every city has the same elevation, costs grow with distance, so candidates come from a
+    GridIndex over the city positions and only nearby cells are priced (from the cost matrix, which
+    also accounts for removed edges). With elevation, a city far away can be cheaper than a close one,
+    so each step scans the unvisited part of the cost matrix row instead.
+
+    Time complexity: O(nk) with a grid ( k = cities near each step), O(n^2) otherwise
+    Space complexity: O(n)
+
+    :param positions: city coordinates, or None when costs do not follow from them (see
+        Scenario.geometric), which always scans
+    :param cutoff: give up as soon as the partial tour costs this much or more
+    :param shared_cutoff: optional multiprocessing.Value holding a cutoff other processes may lower
+        meanwhile, read along with the deadline
+    :return: the tour as city indices, or None if it hits a dead end, the cutoff or the deadline
+    """
+    if positions is not None and np.ptp(elevations) == 0:
+        return _grid_tour(cost_matrix, positions, start, deadline, cutoff, shared_cutoff)
+    return _scan_tour(cost_matrix, start, deadline, cutoff, shared_cutoff)
+
+
+# the deadline (and any shared cutoff) is only checked every so many steps, time.time() costs about as
+# much as a step
+DEADLINE_CHECK_INTERVAL = 64
+
+
+def _grid_tour(
+    cost_matrix: np.ndarray, positions: np.ndarray, start: int, deadline: float, cutoff: float, shared_cutoff
+) -> Optional[list[int]]:
+    index = GridIndex(positions)
+
+    current = start
+    route = [current]
+    cost = 0.0
+    index.remove(current)
+    while index.remaining:
+        if len(route) % DEADLINE_CHECK_INTERVAL == 0:
+            if time.time() > deadline:
+                return None
+            if shared_cutoff is not None:
+                cutoff = min(cutoff, shared_cutoff.value)
+        # a city at Euclidean distance d costs at least MAP_SCALE * d
+        nearest = index.nearest(current, cost_matrix[current], lambda distance: City.MAP_SCALE * distance)
+        if nearest is None:
+            return None  # dead end, no tour from this start
+        cost += cost_matrix[current, nearest]
+        if cost >= cutoff:
+            return None
+        current = nearest
+        route.append(current)
+        index.remove(current)
+    return route
+
+
+def _scan_tour(
+    cost_matrix: np.ndarray, start: int, deadline: float, cutoff: float, shared_cutoff
+) -> Optional[list[int]]:
+    ncities = len(cost_matrix)
+    unvisited = np.ones(ncities, dtype=bool)
+
+    current = start
+    route = [current]
+    cost = 0.0
+    unvisited[current] = False
+    for step in range(1, ncities):
+        if step % DEADLINE_CHECK_INTERVAL == 0:
+            if time.time() > deadline:
+                return None
+            if shared_cutoff is not None:
+                cutoff = min(cutoff, shared_cutoff.value)
+        # T: O(n), vectorized over the cost matrix row
+        costs = np.where(unvisited, cost_matrix[current], np.inf)
+        nearest = int(np.argmin(costs))
+        if costs[nearest] == np.inf:
+            return None  # dead end, no tour from this start
+        cost += costs[nearest]
+        if cost >= cutoff:
+            return None
+        current = nearest
+        route.append(current)
+        unvisited[current] = False
+    return route
+
+
+def best_tours(
+    cost_matrix: np.ndarray,
+    positions: Optional[np.ndarray],
+    elevations: np.ndarray,
+    starts,
+    sample_size: int,
+    deadline: float,
+    on_improvement=None,
+    stop=None,
+    shared_cost=None,
+) -> list[tuple[float, list[int]]]:
+    """
+    The sample_size cheapest valid nearest-neighbour tours from the given start cities. Once sample_size
+    tours are known, a tour is abandoned as soon as it costs more than the worst of them.
+
+    Time complexity: O(s * nk) ( s = number of starts, see nearest_neighbour_tour)
+    Space complexity: O(sample_size * n)
+
+    :param on_improvement: optional on_improvement(cost, tour), called whenever a tour beats every
+        earlier one; returning True stops the search
+    :param stop: optional threading.Event that stops the search when set
+    :param shared_cost: optional multiprocessing.Value holding the best tour cost found by any worker,
+        used as a cutoff and lowered whenever this search finds a better tour; only for sample_size 1,
+        where a tour that cannot beat the best one anywhere is useless
+    :return: (cost, tour) pairs, cheapest first
+    """
+    kept = []  # max-heap of the best tours so far, as (-cost, tie breaker, tour)
+    counter = itertools.count()
+    best_cost = math.inf
+    for start in starts:
+        if time.time() > deadline or (stop is not None and stop.is_set()):
+            break
+        cutoff = -kept[0][0] if len(kept) == sample_size else math.inf
+        if shared_cost is not None:
+            cutoff = min(cutoff, shared_cost.value)
+        route = nearest_neighbour_tour(cost_matrix, positions, elevations, start, deadline, cutoff, shared_cost)
+        if route is None:
+            continue
+
+        cost = cost_matrix[route, np.roll(route, -1)].sum()
+        if shared_cost is not None:
+            cutoff = min(cutoff, shared_cost.value)
+        if cost >= cutoff:  # the edge back to the start can still push it out (or be missing)
+            continue
+        if shared_cost is not None:
+            with shared_cost.get_lock():
+                shared_cost.value = min(shared_cost.value, cost)
+        if len(kept) == sample_size:
+            heapq.heapreplace(kept, (-cost, next(counter), route))
+        else:
+            heapq.heappush(kept, (-cost, next(counter), route))
+
+        if cost < best_cost:
+            best_cost = cost
+            if on_improvement is not None and on_improvement(cost, route):
+                break
+    return sorted(((-cost, route) for cost, _, route in kept), key=lambda tour: tour[0])
+
+
+# Parallel workers keep the scenario arrays and the shared best cost from the pool initializer so they
+# are only sent once.
+_worker_arrays = None
+_worker_shared_cost = None
+
+
+def init_worker(cost_matrix: np.ndarray, positions: np.ndarray, elevations: np.ndarray, shared_cost=None):
+    global _worker_arrays, _worker_shared_cost
+    _worker_arrays = (cost_matrix, positions, elevations)
+    _worker_shared_cost = shared_cost
+
+
+def best_tours_worker(starts, sample_size: int, deadline: float) -> list[tuple[float, list[int]]]:
+    """
+    Process pool entry point for best_tours.
+    """
+    return best_tours(*_worker_arrays, starts, sample_size, deadline, shared_cost=_worker_shared_cost)
@@ -0,0 +1,102 @@
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+# Held-Karp dynamic programming over subsets of cities. Every tour starts at city 0; city c > 0 is bit
+# c - 1 of a subset mask, and best[mask, c - 1] is the cost of the cheapest path that leaves city 0,
+# visits exactly the cities in mask and ends at city c.
+
+MAX_MEMORY = 2 ** 30  # bytes, enough for 22 cities
+
+
+def memory_needed(ncities: int) -> int:
+    """
+    Bytes the DP tables take for ncities cities: a float64 cost and an int8 parent per (subset, end)
+    state, plus the scratch space for pricing the largest layer of subsets.
+
+    Time complexity: O(1)
+    """
+    if ncities < 2:
+        return 0
+    others = ncities - 1
+    states = 2 ** others * others
+    largest_layer = math.comb(others, others // 2)
+    return states * (8 + 1) + 2 * largest_layer * others * 8
+
+
+def held_karp(
+    cost_matrix: np.ndarray, deadline: float = math.inf, max_memory: int = MAX_MEMORY, stop=None
+) -> tuple[Optional[list[int]], float]:
+    """
+    Optimal tour by dynamic programming over subsets, one layer of equal-sized subsets at a time.
+
+    Within a layer, every subset containing city c is extended to c in one vectorized step: the costs
+    of all paths over the subset without c, plus each one's edge to c, reduced with a min over the
+    previous end city. Missing edges are INF and simply never win the min, and nothing assumes
+    symmetric costs.
+
+    Time complexity: O(n^2 * 2^n)
+    Space complexity: O(n * 2^n)
+
+    :param deadline: time.time() after which the search gives up (checked between layers)
+    :param max_memory: largest number of bytes the tables may take (see memory_needed)
+    :param stop: optional threading.Event that stops the search when set (checked between layers)
+    :return: (tour as city indices starting with 0, its cost), or (None, INF) if there is no tour or
+        time ran out (or it was stopped)
+    :raises ValueError: if the tables would take more than max_memory bytes
+    """
+    ncities = len(cost_matrix)
+    if memory_needed(ncities) > max_memory:
+        raise ValueError(
+            f"Held-Karp on {ncities} cities needs about {memory_needed(ncities) / 2 ** 20:.0f} MiB, "
+            f"more than the {max_memory / 2 ** 20:.0f} MiB allowed"
+        )
+    if ncities == 1:
+        return [0], 0.0
+
+    others = ncities - 1
+    full = (1 << others) - 1
+    from_start = cost_matrix[0, 1:]
+    to_start = cost_matrix[1:, 0]
+    between = cost_matrix[1:, 1:]
+
+    masks = np.arange(full + 1)
+    sizes = np.zeros(full + 1, dtype=np.int8)
+    for bit in range(others):
+        sizes += (masks >> bit) & 1
+
+    best = np.full((full + 1, others), np.inf)
+    parent = np.full((full + 1, others), -1, dtype=np.int8)
+    singles = 1 << np.arange(others)
+    best[singles, np.arange(others)] = from_start
+
+    # T: O(n^2 * 2^n), S: O(n * C(n, n/2)) scratch per layer
+    for size in range(2, others + 1):
+        if time.time() > deadline or (stop is not None and stop.is_set()):
+            return None, math.inf
+        layer = masks[sizes == size]
+        for end in range(others):
+            subsets = layer[(layer >> end) & 1 == 1]
+            # cost of every path over subset - {end}, followed by its edge to end
+            extended = best[subsets ^ (1 << end)] + between[:, end]
+            previous = np.argmin(extended, axis=1)
+            best[subsets, end] = extended[np.arange(len(subsets)), previous]
+            parent[subsets, end] = previous
+
+    tours = best[full] + to_start
+    end = int(np.argmin(tours))
+    cost = tours[end]
+    if cost == math.inf:
+        return None, math.inf
+
+    # walk the parents back from the full subset
+    path = []
+    mask = full
+    while end >= 0:
+        path.append(end + 1)
+        mask, end = mask ^ (1 << end), int(parent[mask, end])
+    path.append(0)
+    path.reverse()
+    return path, cost
@@ -0,0 +1,122 @@
+import cProfile
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Opt-in instrumentation for the solvers: time spent per phase, event counters and the BSSF timeline.
+# Solvers take a profiler and default to NULL_PROFILER, whose methods do nothing, so code that is not
+# being profiled only pays for a method call per phase.
+
+
+class Profiler:
+    """
+    Records where a solve spends its time.
+
+    Example:
+        profiler = Profiler(cprofile=True)
+        solver.setProfiler(profiler)
+        with profiler:
+            solver.branch_and_bound(60)
+        profiler.report()  # phases, counters and the BSSF timeline as plain data
+        profiler.dump_stats("branch_and_bound.prof")  # for pstats, snakeviz, etc.
+
+    Phases can nest, and a phase's time includes the phases inside it. Only the calling process is
+    recorded, not the worker processes of the parallel solvers.
+    """
+
+    enabled = True
+
+    def __init__(self, cprofile: bool = False):
+        """
+        :param cprofile: also run cProfile while the profiler is entered as a context manager
+        """
+        self.phases = {}  # name -> [seconds, calls]
+        self.counters = Counter()
+        self.timeline = []  # (seconds since the solver started, cost) for every better solution
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._start = time.perf_counter()
+        self._end = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._end = None
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._end = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += time.perf_counter() - start
+            totals[1] += 1
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def bssf(self, elapsed: float, cost: float):
+        self.timeline.append((elapsed, cost))
+
+    def elapsed(self) -> float:
+        """
+        Seconds spent inside the with block (so far, while still inside it).
+        """
+        return (self._end if self._end is not None else time.perf_counter()) - self._start
+
+    def report(self) -> dict:
+        """
+        :return: {"elapsed": seconds, "phases": {name: {"seconds", "calls", "share"}},
+            "counters": {name: {"total", "per_second"}}, "timeline": [(seconds, cost), ...]}
+        """
+        elapsed = self.elapsed()
+        return {
+            "elapsed": elapsed,
+            "phases": {
+                name: {"seconds": seconds, "calls": calls, "share": seconds / elapsed if elapsed else 0.0}
+                for name, (seconds, calls) in sorted(self.phases.items(), key=lambda item: -item[1][0])
+            },
+            "counters": {
+                name: {"total": total, "per_second": total / elapsed if elapsed else 0.0}
+                for name, total in self.counters.items()
+            },
+            "timeline": list(self.timeline),
+        }
+
+    def dump_stats(self, path: str):
+        """
+        Write the cProfile statistics in the pstats format.
+
+        :raises ValueError: if the profiler was created without cprofile=True
+        """
+        if self._cprofile is None:
+            raise ValueError("Create the Profiler with cprofile=True to dump cProfile statistics")
+        self._cprofile.dump_stats(path)
+
+
+class NullProfiler:
+    """
+    The default profiler: records nothing.
+    """
+
+    enabled = False
+    _phase = nullcontext()
+
+    def phase(self, name: str):
+        return self._phase
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def bssf(self, elapsed: float, cost: float):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,142 @@
+import time
+
+import numpy as np
+
+from local_search import EPSILON, Tour, descend, or_opt_move
+
+# Lin-Kernighan style search built from chains of 2-opt moves on a local_search.Tour, with segment
+# double-bridge kicks between descents (iterated LK).
+
+MAX_DEPTH = 10
+KICK_SPAN = 50  # the three double-bridge cuts fall within this many positions, keeping kicks local
+
+
+def lk_move(tour: Tour, city: int, neighbours: list[list[int]]):
+    """
+    Variable-depth move from `city`: a chain of 2-opt moves, each breaking the edge the previous one
+    closed the tour with, kept to the prefix of the chain that improves the tour the most.
+
+    At each level, the edge (base, end) is broken and base is joined to one of its neighbours, other.
+    other's partner on the far side gets joined to end, and that closing edge is broken at the next
+    level, from end. The candidate giving the shortest tour is taken as long as the gain criterion
+    holds: the chain without its closing edge must be shorter than the edges it removed. Edges added
+    by the chain are never broken again.
+
+    Time complexity: O(MAX_DEPTH * (k + n)) ( k = neighbours per city)
+    Space complexity: O(MAX_DEPTH)
+
+    :return: the cities whose edges changed, or None if no prefix of the chain improves the tour
+    """
+    pos = tour.pos
+    base, end = city, tour.succ(city)
+    total = 0.0
+    best_total, best_level = -EPSILON, 0
+    applied = []  # (start, end, delta) of every reversal, so the chain can be rolled back
+    added = set()
+    touched = [base, end]
+
+    for _ in range(MAX_DEPTH):
+        # with symmetric costs a reversal can flip the rest of the tour instead, which turns the broken
+        # edge around (see Tour.reverse)
+        forward = tour.succ(base) == end
+        broken = tour.cost(base, end) if forward else tour.cost(end, base)
+
+        best = None
+        for other in neighbours[base]:
+            if tour.cost(base, other) >= broken - total:
+                break  # neighbours are sorted, no later one keeps the gain positive either
+            if other == end:
+                continue
+            partner = tour.succ(other) if forward else tour.pred(other)
+            if partner == base or (other, partner) in added or (partner, other) in added:
+                continue
+            if forward:
+                delta = tour.two_opt_delta(pos[base], pos[other])
+                closing = tour.cost(end, partner)
+                segment = (pos[base] + 1, pos[other])
+            else:
+                delta = tour.two_opt_delta(pos[other] - 1, pos[end])
+                closing = tour.cost(partner, end)
+                segment = (pos[other], pos[end])
+            if total + delta < closing and (best is None or delta < best[0]):
+                best = (delta, other, partner, segment)
+        if best is None:
+            break
+
+        delta, other, partner, (start, stop) = best
+        tour.reverse(start, stop, delta)
+        applied.append((start, stop, delta))
+        added.add((base, other))
+        touched += [other, partner]
+        total += delta
+        if total < best_total:
+            best_total, best_level = total, len(applied)
+        base, end = end, partner
+
+    # every reversal is its own inverse, so undo the moves after the best level in reverse order
+    for start, stop, delta in reversed(applied[best_level:]):
+        tour.reverse(start, stop, -delta)
+    return touched if best_level else None
+
+
+MOVE_FUNCTIONS = [lk_move, or_opt_move]
+
+
+def kick(tour: Tour, rng: np.random.Generator, span: int = KICK_SPAN) -> list[int]:
+    """
+    Random double bridge with its three cuts close together (see Tour.double_bridge).
+
+    Time complexity: O(n)
+    Space complexity: O(n)
+
+    :return: the cities at the ends of the changed edges
+    """
+    span = min(span, tour.n)
+    cuts = np.sort(rng.choice(np.arange(1, span), 3, replace=False))
+    return tour.double_bridge(int(rng.integers(tour.n)), cuts.tolist())
+
+
+def iterated_lin_kernighan(
+    cost_matrix: np.ndarray,
+    order,
+    neighbours: list[list[int]],
+    deadline: float,
+    rng: np.random.Generator,
+    symmetric=None,
+    on_improvement=None,
+    stop=None,
+) -> tuple[Tour, int, int]:
+    """
+    Descend with lk_move and Or-opt moves, then kick the tour and descend again around the kick until
+    time.time() passes deadline, keeping a kicked tour only if it ends up shorter.
+
+    Time complexity: O(nk) for the first descent, then O(n + kd) per kick ( d = cities touched)
+    Space complexity: O(n)
+
+    :param on_improvement: optional on_improvement(tour, improvements, kicks), called after the first
+        descent and every improving kick; returning True stops the search
+    :param stop: optional threading.Event that stops the search when set
+    :return: (the best tour, number of improvements found after the first descent, number of kicks)
+    """
+    tour = Tour(cost_matrix, order, symmetric)
+    descend(tour, neighbours, MOVE_FUNCTIONS, deadline)
+
+    improvements = 0
+    kicks = 0
+    if on_improvement is not None and on_improvement(tour, improvements, kicks):
+        return tour, improvements, kicks
+    if tour.n < 8:
+        return tour, improvements, kicks  # too small for three cuts with room around them
+
+    best_order, best_length = tour.order.copy(), tour.length
+    while time.time() < deadline and not (stop is not None and stop.is_set()):
+        kicks += 1
+        descend(tour, neighbours, MOVE_FUNCTIONS, deadline, kick(tour, rng))
+        if tour.length < best_length - EPSILON:
+            improvements += 1
+            best_order, best_length = tour.order.copy(), tour.length
+            if on_improvement is not None and on_improvement(tour, improvements, kicks):
+                break
+        else:
+            tour.restore(best_order, best_length)
+    return tour, improvements, kicks
@@ -0,0 +1,379 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+# Tours are improved in place as index arrays. Missing (INF) edges cost a finite penalty, as in
+# genetic_algorithm.fitness_matrix, so invalid tours can still be improved towards valid ones and
+# every cost change is a plain subtraction.
+
+NEIGHBOURS = 8
+MOVES = ("2opt", "oropt", "swap")
+OR_OPT_MAX_SEGMENT = 3
+EPSILON = 1e-7
+POLISH_SHARE = 0.2  # share of a solver's time allowance kept for polishing its best tour
+
+
+def neighbour_lists(cost_matrix: np.ndarray, k: int = NEIGHBOURS, chunk_size: int = 1024) -> list[list[int]]:
+    """
+    The k cheapest cities to travel to from each city, cheapest first (missing edges left out).
+
+    Time complexity: O(n^2)
+    Space complexity: O(nk) (plus one chunk of rows at a time)
+    """
+    ncities = len(cost_matrix)
+    k = min(k, ncities - 1)
+    neighbours = []
+    for start in range(0, ncities, chunk_size):
+        rows = np.array(cost_matrix[start:start + chunk_size], dtype=float)
+        rows[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+        nearest = np.argpartition(rows, k - 1, axis=1)[:, :k] if k > 0 else np.zeros((len(rows), 0), dtype=int)
+        nearest_costs = np.take_along_axis(rows, nearest, axis=1)
+        by_cost = np.argsort(nearest_costs, axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, by_cost, axis=1)
+        nearest_costs = np.take_along_axis(nearest_costs, by_cost, axis=1)
+        for cities, costs in zip(nearest.tolist(), nearest_costs.tolist()):
+            neighbours.append([city for city, cost in zip(cities, costs) if cost < math.inf])
+    return neighbours
+
+
+class Tour:
+    """
+    A tour under local search: the city order, each city's position in it, and its length.
+
+    For asymmetric costs, reversing a segment changes the cost of the edges inside it. Prefix sums of
+    the edge costs walked both ways price any reversal in O(1); they are rebuilt lazily, once per
+    applied move. Symmetric tours never need them.
+    """
+
+    def __init__(self, cost_matrix: np.ndarray, order, symmetric=None):
+        """
+        Time complexity: O(n^2) for the penalty and symmetry checks, O(n) with symmetric given
+        Space complexity: O(n)
+        """
+        self.costs = cost_matrix
+        self.n = len(cost_matrix)
+        finite_max = np.max(cost_matrix, where=np.isfinite(cost_matrix), initial=1.0)
+        self.penalty = self.n * float(finite_max) + 1.0
+        self.symmetric = np.array_equal(cost_matrix, cost_matrix.T) if symmetric is None else symmetric
+        self.order = np.array(order, dtype=np.int32)
+        self.pos = np.empty(self.n, dtype=np.int32)
+        self.pos[self.order] = np.arange(self.n, dtype=np.int32)
+        self.length = float(self._edge_costs(self.order, np.roll(self.order, -1)).sum())
+        self._prefix = None
+
+    def _edge_costs(self, sources, targets) -> np.ndarray:
+        costs = self.costs[sources, targets]
+        return np.where(np.isfinite(costs), costs, self.penalty)
+
+    def cost(self, a: int, b: int) -> float:
+        """
+        Cost of edge a -> b, with the penalty for missing edges.
+
+        Time complexity: O(1)
+        """
+        cost = self.costs[a, b]
+        return self.penalty if cost == math.inf else float(cost)
+
+    def city(self, position: int) -> int:
+        return int(self.order[position % self.n])
+
+    def succ(self, city: int) -> int:
+        return int(self.order[(self.pos[city] + 1) % self.n])
+
+    def pred(self, city: int) -> int:
+        return int(self.order[self.pos[city] - 1])
+
+    def tour_cost(self):
+        """
+        The TSPSolution cost of the tour (INF if it uses a missing edge).
+        """
+        return round(self.length) if self.length < self.penalty else math.inf
+
+    def _prefix_sums(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        forward[k] is the cost of edges order[0] -> ... -> order[k], backward[k] of order[k] -> ... -> order[0].
+
+        Time complexity: O(n) when rebuilt
+        Space complexity: O(n)
+        """
+        if self._prefix is None:
+            order = self.order
+            forward = np.concatenate(([0.0], np.cumsum(self._edge_costs(order[:-1], order[1:]))))
+            backward = np.concatenate(([0.0], np.cumsum(self._edge_costs(order[1:], order[:-1]))))
+            self._prefix = (forward, backward)
+        return self._prefix
+
+    def reversal_change(self, start: int, end: int) -> float:
+        """
+        Change in the cost of the edges inside the cyclic segment of positions start..end when it is reversed.
+
+        Time complexity: O(1) (O(n) after a move on asymmetric costs)
+        """
+        if self.symmetric:
+            return 0.0
+        forward, backward = self._prefix_sums()
+        start, end = start % self.n, end % self.n
+        if start <= end:
+            return (backward[end] - backward[start]) - (forward[end] - forward[start])
+        # the segment wraps around the end of the order array, through the edge order[-1] -> order[0]
+        wrap = self.cost(self.city(0), self.city(-1)) - self.cost(self.city(-1), self.city(0))
+        return (backward[-1] - backward[start] + backward[end]) - (forward[-1] - forward[start] + forward[end]) + wrap
+
+    def two_opt_delta(self, a: int, b: int) -> float:
+        """
+        Change in length from replacing edges (a, a+1) and (b, b+1) with (a, b) and (a+1, b+1), by positions,
+        which reverses positions a+1..b.
+
+        Time complexity: O(1)
+        """
+        c1, c2, c3, c4 = self.city(a), self.city(a + 1), self.city(b), self.city(b + 1)
+        removed = self.cost(c1, c2) + self.cost(c3, c4)
+        added = self.cost(c1, c3) + self.cost(c2, c4)
+        return added - removed + self.reversal_change(a + 1, b)
+
+    def reverse(self, start: int, end: int, delta: float):
+        """
+        Reverse the cyclic segment of positions start..end. With symmetric costs the shorter of the
+        segment and the rest of the tour is reversed, which gives the same cycle.
+
+        Time complexity: O(k) ( k = length of the reversed part, at most n / 2 when symmetric)
+        Space complexity: O(k)
+        """
+        n = self.n
+        start, end = start % n, end % n
+        size = (end - start) % n + 1
+        if self.symmetric and size > n - size:
+            start, end, size = (end + 1) % n, (start - 1) % n, n - size
+        positions = (start + np.arange(size)) % n
+        cities = self.order[positions][::-1]
+        self.order[positions] = cities
+        self.pos[cities] = positions
+        self.length += delta
+        self._prefix = None
+
+    def swap_delta(self, a: int, b: int) -> float:
+        """
+        Change in length from swapping the cities at positions a and b (neighbours included).
+
+        Time complexity: O(1)
+        """
+        n = self.n
+        u, v = self.city(a), self.city(b)
+
+        def swapped(city):
+            return v if city == u else u if city == v else city
+
+        edges = {(a - 1) % n, a % n, (b - 1) % n, b % n}
+        before = sum(self.cost(self.city(m), self.city(m + 1)) for m in edges)
+        after = sum(self.cost(swapped(self.city(m)), swapped(self.city(m + 1))) for m in edges)
+        return after - before
+
+    def swap(self, a: int, b: int, delta: float):
+        """
+        Time complexity: O(1)
+        """
+        a, b = a % self.n, b % self.n
+        u, v = self.order[a], self.order[b]
+        self.order[a], self.order[b] = v, u
+        self.pos[u], self.pos[v] = b, a
+        self.length += delta
+        self._prefix = None
+
+    def move_delta(self, start: int, size: int, target: int) -> float:
+        """
+        Change in length from moving the segment of `size` cities at position `start` in front of city
+        `target`, keeping its direction. target must not be in the segment or right after it.
+
+        Time complexity: O(1)
+        """
+        first, last = self.city(start), self.city(start + size - 1)
+        before, after = self.city(start - 1), self.city(start + size)
+        previous = self.pred(target)
+        removed = self.cost(before, first) + self.cost(last, after) + self.cost(previous, target)
+        added = self.cost(before, after) + self.cost(previous, first) + self.cost(last, target)
+        return added - removed
+
+    def move(self, start: int, size: int, target: int, delta: float):
+        """
+        Time complexity: O(n)
+        Space complexity: O(n)
+        """
+        rolled = np.roll(self.order, -start)
+        segment, rest = rolled[:size], rolled[size:]
+        at = (self.pos[target] - start) % self.n - size
+        self.order = np.concatenate((rest[:at], segment, rest[at:]))
+        self.pos[self.order] = np.arange(self.n, dtype=np.int32)
+        self.length += delta
+        self._prefix = None
+
+    def double_bridge(self, start: int, cuts) -> list[int]:
+        """
+        Reorder the tour A B C D -> A C B D, where A starts at position `start` and B, C and D start
+        `cuts` positions after it. No segment is reversed, so this works for asymmetric costs.
+
+        Time complexity: O(n)
+        Space complexity: O(n)
+
+        :param cuts: three increasing offsets in 1..n-1
+        :return: the cities at the ends of the six changed edges
+        """
+        first, second, third = cuts
+        rolled = np.roll(self.order, -start)
+        a, b, c, d = rolled[:first], rolled[first:second], rolled[second:third], rolled[third:]
+        ends = [int(city) for city in (a[-1], b[0], b[-1], c[0], c[-1], d[0])]
+        a_end, b_start, b_end, c_start, c_end, d_start = ends
+        removed = self.cost(a_end, b_start) + self.cost(b_end, c_start) + self.cost(c_end, d_start)
+        added = self.cost(a_end, c_start) + self.cost(c_end, b_start) + self.cost(b_end, d_start)
+        self.restore(np.concatenate((a, c, b, d)), self.length + added - removed)
+        return ends
+
+    def restore(self, order: np.ndarray, length: float):
+        """
+        Replace the tour with a saved order of known length.
+
+        Time complexity: O(n)
+        Space complexity: O(n)
+        """
+        self.order = np.array(order, dtype=np.int32)
+        self.pos[self.order] = np.arange(self.n, dtype=np.int32)
+        self.length = length
+        self._prefix = None
+
+
+def two_opt_move(tour: Tour, city: int, neighbours: list[list[int]]):
+    """
+    Try 2-opt moves that make `city` go straight to one of its neighbours.
+
+    :return: the cities whose edges changed, or None if no move improves the tour
+    """
+    a = tour.pos[city]
+    succ = tour.succ(city)
+    current = tour.cost(city, succ)
+    for other in neighbours[city]:
+        if tour.cost(city, other) >= current:
+            break  # neighbours are sorted, no later one shortens the first edge either
+        if other == succ:
+            continue
+        other_succ = tour.succ(other)
+        if other_succ == city:
+            continue
+        b = tour.pos[other]
+        delta = tour.two_opt_delta(a, b)
+        if delta < -EPSILON:
+            tour.reverse(a + 1, b, delta)
+            return [city, succ, other, other_succ]
+    return None
+
+
+def or_opt_move(tour: Tour, city: int, neighbours: list[list[int]]):
+    """
+    Try moving the segment of 1 to OR_OPT_MAX_SEGMENT cities starting at `city` in front of a neighbour
+    of its last city. Only neighbours closer than what cutting the segment out saves are tried.
+
+    :return: the cities whose edges changed, or None if no move improves the tour
+    """
+    start = tour.pos[city]
+    before = tour.city(start - 1)
+    for size in range(1, min(OR_OPT_MAX_SEGMENT, tour.n - 3) + 1):
+        last, after = tour.city(start + size - 1), tour.city(start + size)
+        saving = tour.cost(before, city) + tour.cost(last, after) - tour.cost(before, after)
+        for target in neighbours[last]:
+            if tour.cost(last, target) >= saving:
+                break  # neighbours are sorted, no later one is close enough either
+            if (tour.pos[target] - start) % tour.n <= size:
+                continue  # in the segment or right after it
+            delta = tour.move_delta(start, size, target)
+            if delta < -EPSILON:
+                touched = [before, city, last, after, tour.pred(target), target]
+                tour.move(start, size, target, delta)
+                return touched
+    return None
+
+
+def swap_move(tour: Tour, city: int, neighbours: list[list[int]]):
+    """
+    Try swapping `city` with a neighbour of its predecessor.
+
+    :return: the cities whose edges changed, or None if no move improves the tour
+    """
+    a = tour.pos[city]
+    for other in neighbours[tour.pred(city)]:
+        if other == city:
+            continue
+        b = tour.pos[other]
+        delta = tour.swap_delta(a, b)
+        if delta < -EPSILON:
+            touched = [tour.pred(city), city, tour.succ(city), tour.pred(other), other, tour.succ(other)]
+            tour.swap(a, b, delta)
+            return touched
+    return None
+
+
+MOVE_FUNCTIONS = {"2opt": two_opt_move, "oropt": or_opt_move, "swap": swap_move}
+
+# the deadline is only checked every so many cities, time.time() costs about as much as a move
+DEADLINE_CHECK_INTERVAL = 64
+
+
+def descend(tour: Tour, neighbours: list[list[int]], move_functions, deadline: float = math.inf, cities=None):
+    """
+    Apply improving moves to tour until none is left or time.time() passes deadline.
+
+    The cities to look at wait in a queue (every city unless `cities` is given). A city is taken from
+    the queue and each move is tried with it and the neighbour lists. If one improves the tour, the
+    cities at the ends of the changed edges go back into the queue. Otherwise the city's don't-look bit
+    stays set until a later move touches it, so only the area around recent changes is searched again.
+
+    Time complexity: O(nk) per pass over the queue ( k = neighbours per city), plus O(n) per applied move
+    Space complexity: O(n)
+
+    :param move_functions: functions (tour, city, neighbours) that apply an improving move and return
+        the cities whose edges changed, or return None
+    :param cities: cities to start from
+    """
+    queue = deque(tour.order.tolist() if cities is None else cities)
+    queued = [False] * tour.n
+    for city in queue:
+        queued[city] = True
+    steps = 0
+    while queue:
+        steps += 1
+        if steps % DEADLINE_CHECK_INTERVAL == 0 and time.time() > deadline:
+            break
+        city = queue.popleft()
+        queued[city] = False
+        for move in move_functions:
+            touched = move(tour, city, neighbours)
+            if touched is not None:
+                for other in touched:
+                    if not queued[other]:
+                        queued[other] = True
+                        queue.append(other)
+                break
+
+
+def improve(
+    cost_matrix: np.ndarray,
+    order,
+    neighbours=None,
+    moves=MOVES,
+    deadline: float = math.inf,
+    symmetric=None,
+) -> Tour:
+    """
+    Local search from the given tour until no move improves it or time.time() passes deadline (see descend).
+
+    Time complexity: O(n^2) for the neighbour lists, then O(nk) per pass
+    Space complexity: O(nk)
+
+    :param neighbours: candidate lists from neighbour_lists, computed here if not given
+    :param moves: move types to try, any of "2opt", "oropt" and "swap", in that order
+    :return: the improved Tour
+    """
+    tour = Tour(cost_matrix, order, symmetric)
+    if neighbours is None:
+        neighbours = neighbour_lists(cost_matrix)
+    descend(tour, neighbours, [MOVE_FUNCTIONS[move] for move in moves], deadline)
+    return tour
@@ -1,18 +1,124 @@
+import heapq
+import itertools
 from dataclasses import dataclass, field
+from typing import Optional
 
 import numpy as np
 
+
 # node compatible with priority queue where path len is priority
-@dataclass
+#
+# Only the root holds a reduced matrix. Every other node stores the city it adds, a pointer to its
+# parent and the few row/column reductions (lines, amounts) that turn the parent's matrix into its own,
+# so the matrix can be rebuilt on demand (see branch_and_bound.node_matrix). The cities on the path are
+# also kept as a bitmask, so membership tests do not have to walk the path.
+@dataclass(eq=False, slots=True)
 class Node:
-    matrix: np.ndarray
-    path: list
     cost: float
+    city: int
+    parent: Optional["Node"] = None
+    lines: Optional[np.ndarray] = None
+    amounts: Optional[np.ndarray] = None
+    matrix: Optional[np.ndarray] = None
     path_len: int = field(init=False)
+    visited: int = field(init=False)
 
     def __post_init__(self):
-        self.path_len = len(self.path)
+        if self.parent is None:
+            self.path_len = 1
+            self.visited = 1 << int(self.city)
+        else:
+            self.path_len = self.parent.path_len + 1
+            self.visited = self.parent.visited | (1 << int(self.city))
+
+    def visits(self, city: int) -> bool:
+        """
+        Time complexity: O(1)
+        Space complexity: O(1)
+        """
+        return (self.visited >> int(city)) & 1 == 1
+
+    @property
+    def path(self) -> list[int]:
+        """
+        City indices from the root to this node.
+
+        Time complexity: O(n)
+        Space complexity: O(n)
+        """
+        path = []
+        node = self
+        while node is not None:
+            path.append(node.city)
+            node = node.parent
+        path.reverse()
+        return path
 
     def __lt__(self, other):
         return self.path_len > other.path_len
 
+
+class Frontier:
+    """
+    Queue of search nodes for branch and bound, backed by heapq (no locking).
+
+    The policy decides which node comes out next:
+        "depth":  deepest node first, reaches complete tours (and new BSSFs) quickly
+        "bound":  lowest bound first, expands the fewest nodes but keeps the most in memory
+        "hybrid": deepest node first, ties broken by lowest bound
+
+    With max_size set, nodes pushed while the frontier holds max_size or more go on a stack that is
+    popped first, i.e. the search turns into a pure depth-first search until it has worked the
+    frontier back under the cap.
+    """
+
+    POLICIES = {
+        "depth": lambda node: (-node.path_len,),
+        "bound": lambda node: (node.cost,),
+        "hybrid": lambda node: (-node.path_len, node.cost),
+    }
+
+    def __init__(self, policy: str = "depth", max_size: Optional[int] = None):
+        self._key = self.POLICIES[policy]
+        self._heap = []
+        self._stack = []
+        self._counter = itertools.count()  # ties go to the oldest node and nodes are never compared
+        self.max_size = max_size
+
+    def __len__(self):
+        return len(self._heap) + len(self._stack)
+
+    def _bounded(self) -> bool:
+        return self.max_size is not None and len(self) >= self.max_size
+
+    def push(self, node: Node):
+        """
+        Time complexity: O(log n)
+        Space complexity: O(1)
+        """
+        if self._bounded():
+            self._stack.append(node)
+        else:
+            heapq.heappush(self._heap, (*self._key(node), next(self._counter), node))
+
+    def extend(self, nodes: list[Node]):
+        """
+        Push several nodes (e.g. siblings); in depth-first mode the one with the lowest bound comes out first.
+
+        Time complexity: O(k log n)
+        Space complexity: O(k)
+        """
+        if self._bounded():
+            self._stack.extend(sorted(nodes, key=lambda node: node.cost, reverse=True))
+        else:
+            for node in nodes:
+                self.push(node)
+
+    def pop(self) -> Node:
+        """
+        Time complexity: O(log n)
+        Space complexity: O(1)
+        """
+        if self._stack:
+            return self._stack.pop()
+        return heapq.heappop(self._heap)[-1]
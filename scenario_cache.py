@@ -0,0 +1,148 @@
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from TSPClasses import City, Scenario
+
+# On-disk cache of scenarios and their cost matrices. An entry is a directory named after a hash of
+# everything that decides the scenario's content (coordinates, difficulty, seed and the constants that
+# shape costs), holding positions.npy, elevations.npy and cost_matrix.npy. Entries are loaded memory
+# mapped, so processes that use the same scenario share one copy of its cost matrix through the page
+# cache, and the least recently used entries are deleted once the cache grows past its size cap.
+
+DEFAULT_DIRECTORY = os.environ.get(
+    "TSP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "traveling-salesperson")
+)
+MAX_BYTES = 2 * 2 ** 30
+FORMAT_VERSION = 2  # bump when the cost function or the arrays saved change
+
+# Only these difficulties are fully determined by their inputs; "Normal" and "Hard" draw from whatever
+# state random and NumPy happen to be in.
+CACHEABLE = ("Easy", "Hard (Deterministic)")
+
+FILES = ("positions", "elevations", "cost_matrix")
+RANDOM_STATE = "random_state"  # random's state after building a "Hard (Deterministic)" scenario
+
+
+class ScenarioCache:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = MAX_BYTES):
+        """
+        :param directory: where entries are stored (created when needed)
+        :param max_bytes: size above which least recently used entries are deleted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(positions: np.ndarray, difficulty: str, rand_seed) -> str:
+        """
+        Content address of a scenario: a hash of everything Scenario uses to build it.
+
+        Time complexity: O(n)
+        """
+        digest = hashlib.sha256()
+        seed = rand_seed if difficulty == "Hard (Deterministic)" else None
+        digest.update(
+            repr(
+                (FORMAT_VERSION, difficulty, seed, Scenario.HARD_MODE_FRACTION_TO_REMOVE, City.MAP_SCALE)
+            ).encode()
+        )
+        digest.update(np.ascontiguousarray(positions, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    def get(self, city_locations, difficulty: str, rand_seed) -> Scenario:
+        """
+        The scenario Scenario(city_locations, difficulty, rand_seed) would build, loaded from the cache
+        when possible. On a miss (or for a difficulty that cannot be cached) the scenario is built, and
+        cacheable ones are stored with their cost matrix.
+
+        Time complexity: O(n) on a hit, O(n^2) on a miss
+        Space complexity: O(n) on a hit (the cost matrix is memory mapped), O(n^2) on a miss
+
+        :param city_locations: as for Scenario
+        """
+        if difficulty not in CACHEABLE:
+            return Scenario(city_locations, difficulty, rand_seed)
+
+        if not isinstance(city_locations, np.ndarray):
+            city_locations = np.array([(pt.x(), pt.y()) for pt in city_locations], dtype=float).reshape(-1, 2)
+        entry = os.path.join(self.directory, self.key(city_locations, difficulty, rand_seed))
+
+        scenario = self._load(entry, difficulty)
+        if scenario is not None:
+            return scenario
+
+        scenario = Scenario(city_locations, difficulty, rand_seed)
+        self._store(entry, scenario, random.getstate() if difficulty == "Hard (Deterministic)" else None)
+        return scenario
+
+    def _load(self, entry: str, difficulty: str):
+        """
+        Load an entry. For "Hard (Deterministic)", random is also left in the state building the scenario
+        would have left it in, since its draws are the seed's and callers may rely on what follows.
+        """
+        try:
+            arrays = {name: np.load(os.path.join(entry, name + ".npy"), mmap_mode="r") for name in FILES}
+            if difficulty == "Hard (Deterministic)":
+                random_state = np.load(os.path.join(entry, RANDOM_STATE + ".npy"))
+            os.utime(entry)  # most recently used
+        except (OSError, ValueError):
+            return None  # missing, or deleted by another process while loading
+        if difficulty == "Hard (Deterministic)":
+            version, internal_state = int(random_state[0]), tuple(int(word) for word in random_state[1:])
+            random.setstate((version, internal_state, None))
+        return Scenario.fromArrays(arrays["positions"], arrays["elevations"], difficulty, arrays["cost_matrix"])
+
+    def _store(self, entry: str, scenario: Scenario, random_state=None):
+        """
+        Write the entry to a temporary directory and rename it into place, so other processes never
+        see half an entry; if one of them stored it first, theirs is kept.
+
+        :param random_state: random.getstate() right after building the scenario, saved for
+            "Hard (Deterministic)" entries (see _load)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for name in FILES:
+                np.save(os.path.join(temporary, name + ".npy"), getattr(scenario, name))
+            if random_state is not None:
+                version, internal_state, _ = random_state
+                np.save(os.path.join(temporary, RANDOM_STATE + ".npy"), np.array((version,) + internal_state))
+            os.rename(temporary, entry)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+            return
+        self._evict(keep=entry)
+
+    def _evict(self, keep: str):
+        """
+        Delete least recently used entries until the cache fits in max_bytes (never `keep`, the entry
+        just stored).
+
+        Time complexity: O(e log e) ( e = entries)
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue  # deleted by another process meanwhile
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
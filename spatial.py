@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+
+
+class GridIndex:
+    """
+    Uniform grid over city positions for nearest-neighbour queries among the cities not yet removed.
+
+    Cities are bucketed into square cells holding about `cities_per_cell` cities each. Queries scan
+    rings of cells outwards from the query city, so a city can be removed in O(1) and a query only
+    looks at the cells near the answer.
+    """
+
+    def __init__(self, positions: np.ndarray, cities_per_cell: float = 2.0):
+        """
+        Time complexity: O(n)
+        Space complexity: O(n)
+
+        :param positions: (n, 2) array of city coordinates
+        """
+        ncities = len(positions)
+        low = positions.min(axis=0)
+        span = positions.max(axis=0) - low
+        side = max(1, int(math.sqrt(ncities / cities_per_cell)))
+        self.cell_size = float(span.max()) / side or 1.0
+        self.shape = tuple(int(k) for k in (span // self.cell_size).astype(int) + 1)
+
+        cell_xy = ((positions - low) // self.cell_size).astype(int)
+        cell_xy = np.minimum(cell_xy, np.array(self.shape) - 1)
+        self._cell_xy = cell_xy.tolist()
+        cell_ids = (cell_xy[:, 0] * self.shape[1] + cell_xy[:, 1]).tolist()
+
+        self._cells = [[] for _ in range(self.shape[0] * self.shape[1])]
+        self._slot = [0] * ncities  # position of each city inside its cell's list
+        self._cell_of = cell_ids
+        for city, cell in enumerate(cell_ids):
+            self._slot[city] = len(self._cells[cell])
+            self._cells[cell].append(city)
+        self.remaining = ncities
+
+    def remove(self, city: int):
+        """
+        Time complexity: O(1)
+        Space complexity: O(1)
+        """
+        cell = self._cells[self._cell_of[city]]
+        last = cell.pop()
+        if last != city:
+            slot = self._slot[city]
+            cell[slot] = last
+            self._slot[last] = slot
+        self.remaining -= 1
+
+    def _ring(self, cx: int, cy: int, r: int) -> list[int]:
+        """
+        Cities in the cells exactly r cells away (Chebyshev distance) from cell (cx, cy).
+        """
+        rows, cols = self.shape
+        if r == 0:
+            return list(self._cells[cx * cols + cy])
+        found = []
+        for x in range(max(cx - r, 0), min(cx + r, rows - 1) + 1):
+            if x == cx - r or x == cx + r:
+                ys = range(max(cy - r, 0), min(cy + r, cols - 1) + 1)
+            else:
+                ys = [y for y in (cy - r, cy + r) if 0 <= y < cols]
+            for y in ys:
+                found.extend(self._cells[x * cols + y])
+        return found
+
+    def nearest(self, city: int, costs: np.ndarray, lower_bound) -> int:
+        """
+        The remaining city with the lowest cost from `city`.
+
+        Cities in ring r are at least (r - 1) * cell_size away, so the scan stops as soon as the best
+        cost found is no more than lower_bound of that distance. If every remaining city costs INF
+        (removed edges) the whole grid is scanned.
+
+        Time complexity: O(k) for k cities within the stopping radius, O(n) worst case
+        Space complexity: O(k)
+
+        :param costs: cost from `city` to every city (a cost matrix row)
+        :param lower_bound: function giving the lowest possible cost from `city` to a city at least
+            the given Euclidean distance away
+        :return: the nearest city, or None if every remaining city is unreachable
+        """
+        cx, cy = self._cell_xy[city]
+        best, best_cost = None, np.inf
+        for r in range(max(self.shape)):
+            if best is not None and best_cost <= lower_bound((r - 1) * self.cell_size):
+                break
+            candidates = self._ring(cx, cy, r)
+            if not candidates:
+                continue
+            candidate_costs = costs[candidates]
+            k = int(np.argmin(candidate_costs))
+            if candidate_costs[k] < best_cost:
+                best, best_cost = candidates[k], candidate_costs[k]
+        return best
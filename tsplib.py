@@ -0,0 +1,234 @@
+import itertools
+import math
+import os
+from typing import Optional
+
+import numpy as np
+
+# Reading and writing TSPLIB files: problems (.tsp, .atsp) with EUC_2D, CEIL_2D or EXPLICIT edge weights,
+# and tours (.tour). Files are read line by line, and the numbers of a section are streamed straight
+# into a NumPy array, so large instances never exist as text in memory.
+
+# number of weights an EXPLICIT section holds for n cities, by EDGE_WEIGHT_FORMAT
+WEIGHT_COUNTS = {
+    "FULL_MATRIX": lambda n: n * n,
+    "UPPER_ROW": lambda n: n * (n - 1) // 2,
+    "LOWER_ROW": lambda n: n * (n - 1) // 2,
+    "UPPER_DIAG_ROW": lambda n: n * (n + 1) // 2,
+    "LOWER_DIAG_ROW": lambda n: n * (n + 1) // 2,
+    # a column of the upper triangle is a row of the lower triangle, and so on
+    "UPPER_COL": lambda n: n * (n - 1) // 2,
+    "LOWER_COL": lambda n: n * (n - 1) // 2,
+    "UPPER_DIAG_COL": lambda n: n * (n + 1) // 2,
+    "LOWER_DIAG_COL": lambda n: n * (n + 1) // 2,
+}
+TRIANGLES = {
+    "UPPER_ROW": (np.triu_indices, 1),
+    "LOWER_ROW": (np.tril_indices, -1),
+    "UPPER_DIAG_ROW": (np.triu_indices, 0),
+    "LOWER_DIAG_ROW": (np.tril_indices, 0),
+    "UPPER_COL": (np.tril_indices, -1),
+    "LOWER_COL": (np.triu_indices, 1),
+    "UPPER_DIAG_COL": (np.tril_indices, 0),
+    "LOWER_DIAG_COL": (np.triu_indices, 0),
+}
+EDGE_WEIGHT_TYPES = ("EUC_2D", "CEIL_2D", "EXPLICIT")
+
+
+def _numbers(lines, count: int, dtype=float) -> np.ndarray:
+    """
+    The next `count` whitespace-separated numbers from an iterator of lines, however they are wrapped.
+
+    :raises ValueError: if the lines run out first
+    """
+    return np.fromiter(itertools.chain.from_iterable(map(str.split, lines)), dtype=dtype, count=count)
+
+
+def _coordinates(lines, ncities: int) -> np.ndarray:
+    """
+    A NODE_COORD_SECTION or DISPLAY_DATA_SECTION: one "index x y" line per city.
+    """
+    rows = _numbers(lines, 3 * ncities).reshape(ncities, 3)
+    positions = np.empty((ncities, 2))
+    positions[rows[:, 0].astype(int) - 1] = rows[:, 1:]
+    return positions
+
+
+def _skip_section(lines):
+    """
+    Skip a section that ends with -1 (e.g. FIXED_EDGES_SECTION).
+    """
+    for line in lines:
+        if line.split()[-1:] == ["-1"]:
+            return
+
+
+def _distances(positions: np.ndarray, rounding) -> np.ndarray:
+    x, y = positions.T
+    distances = np.sqrt((x[np.newaxis, :] - x[:, np.newaxis]) ** 2 + (y[np.newaxis, :] - y[:, np.newaxis]) ** 2)
+    return rounding(distances)
+
+
+def read_problem(path: str, missing_edge: Optional[float] = None) -> dict:
+    """
+    Read a TSPLIB .tsp or .atsp file.
+
+    EUC_2D and CEIL_2D costs are computed from the coordinates with TSPLIB's rounding (nearest integer,
+    or up). EXPLICIT weights are read in any of the FULL_MATRIX and triangular formats. Self-edges get
+    INF cost.
+
+    Time complexity: O(n^2)
+    Space complexity: O(n^2)
+
+    :param missing_edge: weights this large or larger are treated as missing edges (INF), e.g. the value
+        write_problem wrote for them
+    :return: {"name", "type", "comment", "dimension", "cost_matrix", "positions"}, where positions are the
+        node coordinates or display data, or None if the file has neither
+    :raises ValueError: for an unsupported or malformed file
+    """
+    header = {}
+    positions = None
+    display = None
+    weights = None
+    with open(path) as file:
+        lines = (line for line in file if line.strip())
+        for line in lines:
+            key, _, value = line.partition(":")
+            key = key.strip().upper()
+            if key == "EOF":
+                break
+            if key.endswith("_SECTION"):
+                if "DIMENSION" not in header:
+                    raise ValueError(f"{path}: {key} before DIMENSION")
+                ncities = int(header["DIMENSION"])
+                if key == "NODE_COORD_SECTION":
+                    positions = _coordinates(lines, ncities)
+                elif key == "DISPLAY_DATA_SECTION":
+                    display = _coordinates(lines, ncities)
+                elif key == "EDGE_WEIGHT_SECTION":
+                    weight_format = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX")
+                    if weight_format not in WEIGHT_COUNTS:
+                        raise ValueError(f"{path}: unsupported EDGE_WEIGHT_FORMAT {weight_format}")
+                    weights = _numbers(lines, WEIGHT_COUNTS[weight_format](ncities))
+                else:
+                    _skip_section(lines)
+            else:
+                header[key] = value.strip()
+
+    ncities = int(header.get("DIMENSION", 0))
+    weight_type = header.get("EDGE_WEIGHT_TYPE")
+    if weight_type == "EUC_2D" and positions is not None:
+        cost_matrix = _distances(positions, lambda distances: np.floor(distances + 0.5))
+    elif weight_type == "CEIL_2D" and positions is not None:
+        cost_matrix = _distances(positions, np.ceil)
+    elif weight_type == "EXPLICIT" and weights is not None:
+        weight_format = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX")
+        if weight_format == "FULL_MATRIX":
+            cost_matrix = weights.reshape(ncities, ncities)
+        else:
+            triangle, offset = TRIANGLES[weight_format]
+            rows, columns = triangle(ncities, offset)
+            cost_matrix = np.zeros((ncities, ncities))
+            cost_matrix[rows, columns] = weights
+            cost_matrix[columns, rows] = weights
+    else:
+        raise ValueError(
+            f"{path}: unsupported or incomplete EDGE_WEIGHT_TYPE {weight_type}, "
+            f"expected one of {', '.join(EDGE_WEIGHT_TYPES)} with its section"
+        )
+
+    if missing_edge is not None:
+        cost_matrix[cost_matrix >= missing_edge] = np.inf
+    np.fill_diagonal(cost_matrix, np.inf)
+    return {
+        "name": header.get("NAME", os.path.splitext(os.path.basename(path))[0]),
+        "type": header.get("TYPE", "TSP"),
+        "comment": header.get("COMMENT"),
+        "dimension": ncities,
+        "cost_matrix": cost_matrix,
+        "positions": positions if positions is not None else display,
+    }
+
+
+def missing_edge_weight(cost_matrix: np.ndarray) -> float:
+    """
+    The weight write_problem uses for missing edges: more than any tour of present edges can cost.
+    """
+    finite = np.isfinite(cost_matrix)
+    return len(cost_matrix) * (cost_matrix[finite].max() if finite.any() else 0.0) + 1.0
+
+
+def write_problem(path: str, cost_matrix: np.ndarray, positions: Optional[np.ndarray] = None, name=None, comment=None):
+    """
+    Write a TSPLIB file with an EXPLICIT FULL_MATRIX, as TYPE TSP when the costs are symmetric and ATSP
+    otherwise, with the positions as TWOD_DISPLAY data. INF costs (missing edges and self-edges) are
+    written as missing_edge_weight(cost_matrix); pass that to read_problem to read them back as INF.
+
+    Rows are written one at a time, so no text copy of the matrix is built.
+
+    Time complexity: O(n^2)
+    Space complexity: O(n)
+    """
+    ncities = len(cost_matrix)
+    missing = missing_edge_weight(cost_matrix)
+    symmetric = np.array_equal(cost_matrix, cost_matrix.T)
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    with open(path, "w") as file:
+        file.write(f"NAME : {name}\n")
+        file.write(f"TYPE : {'TSP' if symmetric else 'ATSP'}\n")
+        comment = f"{comment} " if comment else ""
+        file.write(f"COMMENT : {comment}(missing edges cost {missing:.15g})\n")
+        file.write(f"DIMENSION : {ncities}\n")
+        file.write("EDGE_WEIGHT_TYPE : EXPLICIT\n")
+        file.write("EDGE_WEIGHT_FORMAT : FULL_MATRIX\n")
+        if positions is not None:
+            file.write("DISPLAY_DATA_TYPE : TWOD_DISPLAY\n")
+        file.write("EDGE_WEIGHT_SECTION\n")
+        for row in cost_matrix:
+            np.savetxt(file, np.where(np.isfinite(row), row, missing)[np.newaxis, :], fmt="%.15g")
+        if positions is not None:
+            file.write("DISPLAY_DATA_SECTION\n")
+            for index, (x, y) in enumerate(np.asarray(positions).tolist(), start=1):
+                file.write(f"{index} {x!r} {y!r}\n")
+        file.write("EOF\n")
+
+
+def read_tour(path: str) -> np.ndarray:
+    """
+    Read a TSPLIB .tour file.
+
+    :return: the tour as 0-based city indices
+    :raises ValueError: if the file has no TOUR_SECTION
+    """
+    with open(path) as file:
+        lines = (line for line in file if line.strip())
+        for line in lines:
+            key = line.partition(":")[0].strip().upper()
+            if key == "TOUR_SECTION":
+                tour = []
+                for token in itertools.chain.from_iterable(map(str.split, lines)):
+                    city = int(token)
+                    if city == -1:
+                        break
+                    tour.append(city - 1)
+                return np.array(tour, dtype=np.int32)
+            if key == "EOF":
+                break
+    raise ValueError(f"{path}: no TOUR_SECTION")
+
+
+def write_tour(path: str, order, name=None, cost: float = math.nan):
+    """
+    Write a tour (0-based city indices) as a TSPLIB .tour file.
+    """
+    order = np.asarray(order)
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    with open(path, "w") as file:
+        file.write(f"NAME : {name}\n")
+        if not math.isnan(cost):
+            file.write(f"COMMENT : Length {cost:.15g}\n")
+        file.write("TYPE : TOUR\n")
+        file.write(f"DIMENSION : {len(order)}\n")
+        file.write("TOUR_SECTION\n")
+        file.writelines(f"{city + 1}\n" for city in order.tolist())
+        file.write("-1\nEOF\n")